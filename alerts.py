@@ -0,0 +1,71 @@
+import queue
+import threading
+import time
+
+import db
+
+# Low-stock alerting off the request path. Inventory writes only enqueue the
+# item id (via db.add_item_listener); a daemon thread drains the queue in
+# batches and lets db.evaluate_stock_alerts decide which thresholds were
+# crossed. The unique open-alert index de-duplicates, so an item that stays
+# low raises one alert until it recovers. A periodic sweep catches anything
+# the queue dropped or that changed outside the app.
+QUEUE_SIZE = 10000
+BATCH_SIZE = 500
+BATCH_WAIT = 0.5       # seconds to gather more ids after the first
+SWEEP_INTERVAL = 300   # seconds between full sweeps
+
+class AlertEvaluator:
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._thread = None
+
+    def on_item_change(self, action, item_id, name, category):
+        try:
+            self._queue.put_nowait(item_id)
+        except queue.Full:
+            pass  # The next sweep picks it up
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stock-alert-evaluator", daemon=True)
+        self._thread.start()
+
+    def _drain(self, timeout):
+        try:
+            ids = {self._queue.get(timeout=timeout)}
+        except queue.Empty:
+            return set()
+        while len(ids) < BATCH_SIZE:
+            try:
+                ids.add(self._queue.get(timeout=BATCH_WAIT))
+            except queue.Empty:
+                break
+        return ids
+
+    def _run(self):
+        next_sweep = 0
+        while True:
+            ids = self._drain(max(0, next_sweep - time.monotonic()))
+            if ids:
+                self.evaluate(ids)
+            if time.monotonic() >= next_sweep:
+                self.evaluate(None)
+                next_sweep = time.monotonic() + SWEEP_INTERVAL
+
+    def evaluate(self, item_ids):
+        try:
+            raised, resolved = db.evaluate_stock_alerts(item_ids)
+        except Exception as e:
+            print(f"Stock alert evaluation failed: {e}")
+            return
+        for item_id, name, quantity, level in raised:
+            db.add_log("SYSTEM", "LOW_STOCK_ALERT", f"Item '{name}' (ID {item_id}) is at {quantity}, reorder level {level}.")
+        for item_id, name, quantity, level in resolved:
+            db.add_log("SYSTEM", "LOW_STOCK_RESOLVED", f"Item '{name}' (ID {item_id}) is back above reorder level {level}.")
+
+def start_evaluator():
+    """Follow inventory writes and raise/resolve low-stock alerts in the background."""
+    evaluator = AlertEvaluator()
+    db.add_item_listener(evaluator.on_item_change)
+    evaluator.start()
+    return evaluator
@@ -0,0 +1,292 @@
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import auth
+import db
+import throttle
+
+# Read-only JSON API over the same SQLite file as the Streamlit app.
+#   POST /api/token        {"username", "password", "code"} -> bearer token
+#   GET  /api/items        ?limit=&cursor=&sort=&desc=  or  ?q=&limit=&cursor=
+#   GET  /api/items/<id>
+#   GET  /api/logs         ?limit=&cursor=&since=&until=&username=&action= (admins)
+# List responses carry a weak ETag built from the table's data version, so an
+# If-None-Match revalidation is answered 304 without running the query.
+DEFAULT_PORT = 8502
+TOKEN_TTL = 3600  # seconds
+DEFAULT_PAGE = 50
+MAX_PAGE = 500
+MAX_BODY = 4096
+
+# Tokens are signed with this key; set INVENTORY_API_SECRET so they survive a restart
+SECRET = os.environ.get('INVENTORY_API_SECRET', '').encode() or secrets.token_bytes(32)
+
+_throttle = throttle.LoginThrottle(persist=True)
+
+class ApiError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+# --- Tokens ---
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+def _password_fingerprint(password_hash):
+    # Ties a token to the current password: changing it revokes old tokens
+    return hashlib.sha256(password_hash.encode()).hexdigest()[:16]
+
+def _sign(body):
+    return _b64encode(hmac.new(SECRET, body.encode(), hashlib.sha256).digest())
+
+def issue_token(user):
+    payload = {'sub': user[1], 'pwd': _password_fingerprint(user[2]), 'exp': int(time.time()) + TOKEN_TTL}
+    body = _b64encode(json.dumps(payload, separators=(',', ':')).encode())
+    return f"{body}.{_sign(body)}"
+
+def authenticate(token):
+    """Return {'username', 'role'} for a valid token, else None. The role is read from the users table."""
+    body, _, signature = token.partition('.')
+    if not signature or not hmac.compare_digest(signature, _sign(body)):
+        return None
+    try:
+        payload = json.loads(_b64decode(body))
+    except ValueError:
+        return None
+    if payload.get('exp', 0) < time.time():
+        return None
+    user = db.get_user(payload.get('sub', ''))
+    if not user or payload.get('pwd') != _password_fingerprint(user[2]):
+        return None
+    return {'username': user[1], 'role': user[4]}
+
+# --- Cursors and ETags ---
+def encode_cursor(cursor):
+    return _b64encode(json.dumps(cursor).encode()) if cursor is not None else None
+
+def decode_cursor(text):
+    if not text:
+        return None
+    try:
+        return json.loads(_b64decode(text))
+    except ValueError:
+        raise ApiError(400, "Invalid cursor")
+
+def decode_key_cursor(text):
+    """A keyset cursor: [sort value, id] with a scalar sort value and an int id."""
+    cursor = decode_cursor(text)
+    if cursor is None:
+        return None
+    if not (isinstance(cursor, list) and len(cursor) == 2
+            and isinstance(cursor[0], (str, int, float, type(None)))
+            and isinstance(cursor[1], int) and not isinstance(cursor[1], bool)):
+        raise ApiError(400, "Invalid cursor")
+    return tuple(cursor)
+
+def make_etag(table, version, path):
+    digest = hashlib.sha1(path.encode()).hexdigest()[:12]
+    return f'W/"{table}-{version}-{digest}"'
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    # Weak comparison: W/ prefixes are ignored on both sides
+    tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    return '*' in tags or etag.removeprefix('W/') in tags
+
+def _records(frame):
+    return json.loads(frame.to_json(orient='records'))
+
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = "InventoryAPI/1.0"
+
+    # --- Plumbing ---
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_not_modified(self, etag):
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'private, no-cache')
+        self.end_headers()
+
+    def _dispatch(self, routes):
+        url = urlsplit(self.path)
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        parts = [part for part in url.path.split('/') if part]
+        try:
+            handler = routes.get(tuple(parts[:2]))
+            if handler is None or len(parts) > 3:
+                raise ApiError(404, "Not found")
+            handler(*parts[2:])
+        except ApiError as e:
+            self._send_json(e.status, {'error': str(e)}, e.headers)
+        except TimeoutError:
+            self._send_json(503, {'error': "Server busy, try again"}, {'Retry-After': '1'})
+        except Exception as e:
+            # Answer rather than drop the connection; the details stay in the server log
+            print(f"Unhandled error for {self.command} {self.path}: {e!r}")
+            self._send_json(500, {'error': "Internal server error"})
+
+    def do_GET(self):
+        self._dispatch({('api', 'items'): self.get_items, ('api', 'logs'): self.get_logs})
+
+    def do_POST(self):
+        self._dispatch({('api', 'token'): self.post_token})
+
+    def _user(self):
+        scheme, _, token = self.headers.get('Authorization', '').partition(' ')
+        user = authenticate(token.strip()) if scheme.lower() == 'bearer' else None
+        if user is None:
+            raise ApiError(401, "Missing or invalid token", {'WWW-Authenticate': 'Bearer'})
+        return user
+
+    def _limit(self):
+        try:
+            limit = int(self.query.get('limit', DEFAULT_PAGE))
+        except ValueError:
+            raise ApiError(400, "limit must be an integer")
+        return max(1, min(limit, MAX_PAGE))
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY:
+            raise ApiError(413, "Request body too large")
+        try:
+            data = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            raise ApiError(400, "Body must be JSON")
+        if not isinstance(data, dict):
+            raise ApiError(400, "Body must be a JSON object")
+        return data
+
+    # --- Endpoints ---
+    def post_token(self, *extra):
+        if extra:
+            raise ApiError(404, "Not found")
+        data = self._read_json()
+        username = str(data.get('username') or '')
+        password = str(data.get('password') or '')
+        code = str(data.get('code') or '')
+
+        # Same limiter as the login form, keyed by client address instead of session
+        throttle_keys = throttle.login_keys(username, self.client_address[0])
+        retry_after = _throttle.acquire(throttle_keys)
+        if retry_after:
+            db.add_log(username or "UNKNOWN", "LOGIN_THROTTLED", f"API token request rejected; retry allowed in {retry_after}s.")
+            raise ApiError(429, "Too many login attempts", {'Retry-After': str(retry_after)})
+        if len(password.encode('utf-8')) > 72:
+            raise ApiError(400, "Password is too long (max 72 bytes)")
+
+        user = db.get_user(username)
+        valid, new_hash = auth.verify_and_update(password, user[2]) if user else (False, None)
+        if not valid or not auth.verify_totp(user[3], code):
+            _throttle.record_failure(throttle_keys)
+            raise ApiError(401, "Invalid credentials or 2FA code")
+
+        _throttle.record_success(throttle_keys)
+        if new_hash:
+            db.update_password_hash(username, new_hash)
+            db.add_log(username, "PASSWORD_REHASH", "Password hash upgraded to current Argon2 parameters.")
+            user = db.get_user(username)
+        db.add_log(username, "API_TOKEN", f"API token issued to {self.client_address[0]}.")
+        self._send_json(200, {'token': issue_token(user), 'token_type': 'Bearer', 'expires_in': TOKEN_TTL, 'role': user[4]})
+
+    def get_items(self, item_id=None):
+        self._user()
+        if item_id is not None:
+            if not item_id.isdigit():
+                raise ApiError(404, "Not found")
+            item = db.get_item(int(item_id))
+            if item is None:
+                raise ApiError(404, "Item not found")
+            self._send_json(200, item)
+            return
+
+        # Read the version before the data: a racing write leaves a stale tag,
+        # which only costs the client one extra full response.
+        version = db.get_data_version('inventory')
+        etag = make_etag('inventory', version, self.path)
+        if etag_matches(self.headers.get('If-None-Match'), etag):
+            self._send_not_modified(etag)
+            return
+
+        limit = self._limit()
+        query = self.query.get('q', '').strip()
+        if query:
+            offset = decode_cursor(self.query.get('cursor')) or 0
+            if not isinstance(offset, int) or offset < 0:
+                raise ApiError(400, "Invalid cursor")
+            page = db.search_items(query, limit + 1, offset)
+            next_cursor = offset + limit if len(page) > limit else None
+            page = page.iloc[:limit]
+        else:
+            cursor = decode_key_cursor(self.query.get('cursor'))
+            descending = self.query.get('desc', '').lower() in ('1', 'true', 'yes')
+            try:
+                page, next_cursor = db.get_items_page(
+                    limit, cursor, self.query.get('sort', 'id'), descending)
+            except ValueError as e:
+                raise ApiError(400, str(e))
+        self._send_json(200, {'items': _records(page), 'next_cursor': encode_cursor(next_cursor), 'version': version},
+                        {'ETag': etag, 'Cache-Control': 'private, no-cache'})
+
+    def get_logs(self, *extra):
+        if extra:
+            raise ApiError(404, "Not found")
+        if self._user()['role'] != 'admin':
+            raise ApiError(403, "Admins only")
+
+        version = db.get_data_version('logs')
+        etag = make_etag('logs', version, self.path)
+        if etag_matches(self.headers.get('If-None-Match'), etag):
+            self._send_not_modified(etag)
+            return
+
+        cursor = decode_key_cursor(self.query.get('cursor'))
+        logs, next_cursor = db.get_logs(
+            since=self.query.get('since'), until=self.query.get('until'),
+            username=self.query.get('username'), action=self.query.get('action'),
+            limit=self._limit(), cursor=cursor,
+        )
+        self._send_json(200, {'logs': _records(logs), 'next_cursor': encode_cursor(next_cursor), 'version': version},
+                        {'ETag': etag, 'Cache-Control': 'private, no-cache'})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read-only JSON API for the inventory database")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--db", default=db.DB_NAME, help="SQLite file shared with the Streamlit app")
+    args = parser.parse_args()
+
+    db.DB_NAME = args.db
+    db.init_db()
+    if 'INVENTORY_API_SECRET' not in os.environ:
+        print("INVENTORY_API_SECRET is not set; tokens will not survive a restart.")
+    server = ThreadingHTTPServer((args.host, args.port), ApiHandler)
+    print(f"Serving inventory API on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -1,8 +1,17 @@
 import streamlit as st
 import pandas as pd
+import io
+import tempfile
 import time
+import uuid
+from datetime import datetime, time as dt_time, timedelta
 import db
+import alerts
 import auth
+import autocomplete
+import inventory_io
+import metrics
+import throttle
 
 # --- Page Config ---
 st.set_page_config(page_title="Inventory System", layout="wide", page_icon="📦")
@@ -84,7 +93,35 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- Init DB ---
-db.init_db()
+# Cached as a resource so migrations and admin seeding run once per process,
+# not on every rerun of every session.
+@st.cache_resource
+def bootstrap_db():
+    metrics.install()  # Before init_db so the bootstrap queries are measured too
+    db.init_db()
+    return db.get_schema_version()
+
+bootstrap_db()
+
+# Loaded on a background thread at startup, then kept current by db's item
+# listeners; searches before the load finishes get partial suggestions
+@st.cache_resource
+def get_autocomplete_index():
+    return autocomplete.build_index(background=True)
+
+get_autocomplete_index()
+
+# Shared by all sessions; username lockouts are persisted in SQLite
+@st.cache_resource
+def get_login_throttle():
+    return throttle.LoginThrottle(persist=True)
+
+# One evaluator per process; inventory writes queue their item ids for it
+@st.cache_resource
+def get_stock_alert_evaluator():
+    return alerts.start_evaluator()
+
+get_stock_alert_evaluator()
 
 # --- Session State Management ---
 if 'auth_step' not in st.session_state:
@@ -97,6 +134,15 @@ if 'temp_reg_data' not in st.session_state:
     st.session_state.temp_reg_data = {}
 if 'toggle_register' not in st.session_state:
     st.session_state.toggle_register = False
+if 'session_key' not in st.session_state:
+    st.session_state.session_key = uuid.uuid4().hex
+
+# Everything db/auth does from here on is attributed to this rerun
+metrics.begin_rerun(st.session_state.session_key,
+                    'dashboard' if st.session_state.authenticated else st.session_state.auth_step)
+
+def use_suggestion(suggestion):
+    st.session_state.search_query = suggestion
 
 # --- Logout Function ---
 def logout():
@@ -130,17 +176,34 @@ def login_view():
                 st.write("")
                 
                 if st.button("Sign In"):
-                    if len(password.encode('utf-8')) > 72:
+                    # Rate limit before any hashing work is done
+                    throttle_keys = throttle.login_keys(username, st.session_state.session_key)
+                    retry_after = get_login_throttle().acquire(throttle_keys)
+                    if retry_after:
+                        db.add_log(username or "UNKNOWN", "LOGIN_THROTTLED", f"Attempt rejected; retry allowed in {retry_after}s.")
+                        st.error(f"Too many login attempts. Please try again in {retry_after} seconds.")
+                    elif len(password.encode('utf-8')) > 72:
                          st.error("Password is too long (max 72 bytes)")
                     else:
                         user = db.get_user(username)
-                        if user and auth.verify_password(password, user[2]):
+                        try:
+                            valid, new_hash = auth.verify_and_update(password, user[2]) if user else (False, None)
+                        except TimeoutError:
+                            st.error("The server is busy. Please try again in a moment.")
+                            st.stop()
+                        if valid:
+                            get_login_throttle().record_success(throttle_keys)
+                            if new_hash:
+                                # Stored hash predates the current Argon2 parameters
+                                db.update_password_hash(username, new_hash)
+                                db.add_log(username, "PASSWORD_REHASH", "Password hash upgraded to current Argon2 parameters.")
                             st.session_state.username = username
                             st.session_state.role = user[4] # role is at index 4 now
                             st.session_state.auth_step = 'otp'
                             db.add_log(username, "LOGIN_ATTEMPT", "Valid credentials, awaiting 2FA.")
                             st.rerun()
                         else:
+                            get_login_throttle().record_failure(throttle_keys)
                             st.error("Wrong Username/Password.")
 
     # Right Side (Green) - "New Here?"
@@ -272,7 +335,7 @@ def register_otp_view():
         st.rerun()
 
     uri = auth.get_totp_uri(data['username'], data['secret'])
-    qr_image = auth.generate_qr_code(uri)
+    qr_image = auth.generate_qr_code(uri, fmt='svg')
     
     c1, c2, c3 = st.columns([1, 1, 1])
     with c2:
@@ -283,16 +346,24 @@ def register_otp_view():
         code = st.text_input("Enter 6-digit Code", max_chars=6, label_visibility="collapsed", placeholder="000000")
         if st.button("Verify & Register"):
             if auth.verify_totp(data['secret'], code):
-                hashed = auth.hash_password(data['password'])
+                try:
+                    hashed = auth.hash_password(data['password'])
+                except TimeoutError:
+                    st.error("The server is busy. Please try again in a moment.")
+                    st.stop()
                 # Use the role from temp data (defaults to 'user', but enables flexibility)
                 role = data.get('role', 'user') 
                 if db.add_user(data['username'], hashed, data['secret'], role):
+                    auth.evict_qr_code(uri)
                     st.success("Registration Successful!")
                     db.add_log(data['username'], "USER_REGISTER", f"New user registered as {role}")
                     st.session_state.temp_reg_data = {}
                     st.session_state.auth_step = 'login'
                     time.sleep(2)
                     st.rerun()
+                else:
+                    # The availability check can be briefly stale; the UNIQUE constraint is not
+                    st.error("Username already exists. Please start over with a different one.")
             else:
                 st.error("Invalid Code")
 
@@ -333,17 +404,27 @@ def otp_view():
 # --- Confirmation Dialogs ---
 
 @st.dialog("Confirm Deletion")
-def confirm_delete_dialog(item_id, item_name):
+def confirm_delete_dialog(item):
+    # `item` is the row as shown here; the delete only lands if it is unchanged
+    item_id, item_name = item['id'], item['name']
     st.warning(f"Are you sure you want to delete **{item_name}** (ID: {item_id})?")
+    st.write(f"- **Category:** {item['category']}")
+    st.write(f"- **Quantity:** {item['quantity']}")
     st.write("This action cannot be undone.")
     c1, c2 = st.columns(2)
     with c1:
         if st.button("Yes, Delete", type="primary"):
-            db.delete_item(item_id)
-            db.add_log(st.session_state.username, "DELETE_ITEM", f"Deleted {item_name} (ID: {item_id})")
-            st.success(f"Deleted Item ID {item_id}")
-            time.sleep(1)
-            st.rerun()
+            if db.delete_item(item_id, expected_version=item['row_version']):
+                db.add_log(st.session_state.username, "DELETE_ITEM", f"Deleted {item_name} (ID: {item_id})")
+                st.success(f"Deleted Item ID {item_id}")
+                time.sleep(1)
+                st.rerun()
+            elif db.get_item(item_id) is None:
+                st.info("This item was already deleted by someone else.")
+            else:
+                db.add_log(st.session_state.username, "DELETE_CONFLICT", f"Delete of ID {item_id} rejected: item changed since it was loaded.")
+                st.error("Someone else changed this item after you opened this dialog. "
+                         "Close it and review the latest version before deleting.")
     with c2:
         if st.button("Cancel"):
             st.rerun()
@@ -370,24 +451,89 @@ def confirm_add_item_dialog(name, cat, qty, price, desc):
             st.rerun()
 
 @st.dialog("Confirm Update")
-def confirm_update_item_dialog(item_id, name, cat, qty, price, desc):
-    st.write(f"Are you sure you want to update item **{name}** (ID: {item_id})?")
-    st.write("New Details:")
-    st.write(f"- **Category:** {cat}")
-    st.write(f"- **Quantity:** {qty}")
-    st.write(f"- **Price:** PHP {price:,.2f}")
-    st.write(f"- **Description:** {desc}")
+def confirm_update_item_dialog(item_id, name, cat, qty, price, desc, base):
+    conflict_key = f"update_conflict_{item_id}"
+    if not st.session_state.get(conflict_key):
+        st.write(f"Are you sure you want to update item **{name}** (ID: {item_id})?")
+        st.write("New Details:")
+        st.write(f"- **Category:** {cat}")
+        st.write(f"- **Quantity:** {qty}")
+        st.write(f"- **Price:** PHP {price:,.2f}")
+        st.write(f"- **Description:** {desc}")
+
+        c1, c2 = st.columns(2)
+        with c1:
+            if st.button("Confirm Update", type="primary"):
+                # Only lands if the row is still at the version the form was loaded from
+                if db.update_item(item_id, name, cat, qty, price, desc, expected_version=base['row_version']):
+                    db.add_log(st.session_state.username, "UPDATE_ITEM", f"Updated {name} (ID: {item_id}) details.")
+                    st.session_state.pop(f"edit_base_{item_id}", None)
+                    st.success("Item Updated Successfully!")
+                    time.sleep(1)
+                    st.rerun()
+                db.add_log(st.session_state.username, "UPDATE_CONFLICT", f"Update of ID {item_id} rejected: item changed since it was loaded.")
+                st.session_state[conflict_key] = True
+                st.rerun(scope="fragment")
+        with c2:
+            if st.button("Cancel"):
+                st.rerun()
+        return
+
+    # --- Conflict: someone else saved this item after the form was loaded ---
+    theirs = db.get_item(item_id)
+    if theirs is None:
+        st.error(f"Item ID {item_id} was deleted by another user while you were editing it.")
+        c1, c2 = st.columns(2)
+        with c1:
+            if st.button("Re-create with My Changes", type="primary"):
+                new_id = db.add_item(name, cat, qty, price, desc)
+                db.add_log(st.session_state.username, "ADD_ITEM", f"Re-created deleted item {item_id} as {name} (ID: {new_id})")
+                st.session_state.pop(conflict_key, None)
+                st.session_state.pop(f"edit_base_{item_id}", None)
+                st.rerun()
+        with c2:
+            if st.button("Discard My Changes"):
+                st.session_state.pop(conflict_key, None)
+                st.session_state.pop(f"edit_base_{item_id}", None)
+                st.rerun()
+        return
+
+    mine = {'name': name, 'category': cat, 'quantity': qty, 'price': price, 'description': desc}
+    merged, conflicts = db.merge_item_changes(base, mine, theirs)
+    st.warning(f"**{theirs['name']}** (ID: {item_id}) was changed by someone else at {theirs['updated_at']} UTC "
+               "after you opened it. Review the merge below.")
+    st.dataframe(pd.DataFrame({
+        'Field': [field.title() for field in db.EDITABLE_FIELDS],
+        'When loaded': [base[field] for field in db.EDITABLE_FIELDS],
+        'Theirs (current)': [theirs[field] for field in db.EDITABLE_FIELDS],
+        'Yours': [mine[field] for field in db.EDITABLE_FIELDS],
+    }).astype(str), hide_index=True, use_container_width=True)
+
+    if conflicts:
+        st.write("Both of you changed these fields; choose which value to keep:")
+        for field in conflicts:
+            choice = st.radio(field.title(), ["Mine", "Theirs"], horizontal=True, key=f"merge_{item_id}_{field}",
+                              format_func=lambda c, f=field: f"{c}: {mine[f] if c == 'Mine' else theirs[f]}")
+            merged[field] = mine[field] if choice == "Mine" else theirs[field]
+    else:
+        st.caption("No overlapping edits: their changes and yours combine cleanly.")
 
     c1, c2 = st.columns(2)
     with c1:
-        if st.button("Confirm Update", type="primary"):
-            db.update_item(item_id, name, cat, qty, price, desc)
-            db.add_log(st.session_state.username, "UPDATE_ITEM", f"Updated {name} (ID: {item_id}) details.")
-            st.success("Item Updated Successfully!")
-            time.sleep(1)
-            st.rerun()
+        if st.button("Save Merged Version", type="primary"):
+            if db.update_item(item_id, *(merged[field] for field in db.EDITABLE_FIELDS), expected_version=theirs['row_version']):
+                db.add_log(st.session_state.username, "UPDATE_ITEM", f"Updated {merged['name']} (ID: {item_id}) details (merged).")
+                st.session_state.pop(conflict_key, None)
+                st.session_state.pop(f"edit_base_{item_id}", None)
+                st.success("Merged update saved!")
+                time.sleep(1)
+                st.rerun()
+            # Changed yet again; the fragment rerun shows the newest version
+            st.rerun(scope="fragment")
     with c2:
-        if st.button("Cancel"):
+        if st.button("Discard My Changes"):
+            st.session_state.pop(conflict_key, None)
+            st.session_state.pop(f"edit_base_{item_id}", None)
             st.rerun()
 
 @st.dialog("Confirm Admin Creation")
@@ -398,14 +544,19 @@ def confirm_create_admin_dialog(new_admin_user, new_admin_pass):
     with c1:
         if st.button("Yes, Create Admin", type="primary"):
              secret = auth.generate_totp_secret()
-             hashed = auth.hash_password(new_admin_pass)
+             try:
+                 hashed = auth.hash_password(new_admin_pass)
+             except TimeoutError:
+                 st.error("The server is busy. Please try again in a moment.")
+                 st.stop()
              if db.add_user(new_admin_user, hashed, secret, role='admin'):
                  db.add_log(st.session_state.username, "ADMIN_CREATE_ADMIN", f"Created new admin: {new_admin_user}")
                  st.success(f"Admin '{new_admin_user}' created!")
                  st.warning("⚠️ Please scan this QR code immediately. It will not be shown again.")
                  
                  uri = auth.get_totp_uri(new_admin_user, secret)
-                 qr = auth.generate_qr_code(uri)
+                 qr = auth.generate_qr_code(uri, fmt='svg')
+                 auth.evict_qr_code(uri)  # Shown once; don't keep the secret around
                  st.image(qr, width=200, caption=f"TOTP Setup for {new_admin_user}")
                  st.write(f"Secret Key: `{secret}`")
                  if st.button("Done"):
@@ -416,6 +567,84 @@ def confirm_create_admin_dialog(new_admin_user, new_admin_pass):
         if st.button("Cancel"):
             st.rerun()
 
+# --- Batch Grid Editing ---
+def batch_edit_grid(page_ids):
+    # The grid edits a snapshot taken when it opened, row versions included,
+    # so a save can tell our edits apart from changes others made meanwhile.
+    snapshot = st.session_state.get('grid_snapshot')
+    if snapshot is None or snapshot['ids'] != page_ids:
+        snapshot = {'ids': page_ids, 'rows': db.get_items_by_ids(page_ids), 'nonce': uuid.uuid4().hex}
+        st.session_state.grid_snapshot = snapshot
+    base = snapshot['rows']
+
+    edited = st.data_editor(
+        base[db.ITEM_COLUMNS], key=f"grid_{snapshot['nonce']}", disabled=['id'], num_rows="fixed",
+        hide_index=True, use_container_width=True,
+        column_config={
+            'id': 'ID', 'name': 'Name', 'category': 'Category', 'description': 'Description',
+            'quantity': st.column_config.NumberColumn('Quantity', min_value=0, step=1),
+            'price': st.column_config.NumberColumn('Price (PHP)', min_value=0.0, format="%.2f"),
+        },
+    )
+
+    # Diff against the snapshot: only rows with a changed field are written
+    before = base.set_index('id')[db.EDITABLE_FIELDS]
+    after = edited.set_index('id')[db.EDITABLE_FIELDS]
+    unchanged = ((before == after) | (before.isna() & after.isna())).all(axis=1)
+    changed_ids = unchanged.index[~unchanged].tolist()
+
+    gc1, gc2, gc3 = st.columns([2, 1, 1])
+    with gc1:
+        st.caption(f"{len(changed_ids)} row(s) changed. Saving applies every change or none; "
+                   "unsaved edits are dropped when you leave this page.")
+    with gc2:
+        if st.button("Discard Edits", disabled=not changed_ids):
+            st.session_state.pop('grid_snapshot', None)
+            st.rerun()
+    with gc3:
+        save = st.button(f"Save {len(changed_ids)} Change(s)", type="primary", disabled=not changed_ids)
+    if not save:
+        return
+
+    versions = base.set_index('id')['row_version']
+    changes, errors = [], []
+    for item_id in changed_ids:
+        row = {field: None if pd.isna(value) else value for field, value in after.loc[item_id].items()}
+        values, error = inventory_io.validate_row(row)
+        if error:
+            errors.append(f"- ID {item_id}: {error}")
+        else:
+            changes.append((item_id, *values, int(versions[item_id])))
+    if errors:
+        st.error("Nothing was saved. Fix these rows first:\n" + "\n".join(errors))
+        return
+
+    id_list = ", ".join(str(item_id) for item_id in changed_ids[:20]) + (" ..." if len(changed_ids) > 20 else "")
+    conflicts = db.update_items(changes)
+    if conflicts:
+        db.add_log(st.session_state.username, "UPDATE_CONFLICT",
+                   f"Grid edit of {len(changes)} items rejected; changed by others meanwhile: IDs {', '.join(map(str, conflicts))}")
+        st.error(f"Nothing was saved: item(s) {', '.join(map(str, conflicts))} were changed by someone else after "
+                 "the grid was loaded. Discard your edits to load the latest values.")
+        return
+    # One audit entry for the whole batch
+    db.add_log(st.session_state.username, "BATCH_UPDATE_ITEMS", f"Updated {len(changes)} items in grid edit (IDs: {id_list})")
+    st.session_state.pop('grid_snapshot', None)
+    st.success(f"Saved {len(changes)} item(s).")
+    time.sleep(1)
+    st.rerun()
+
+def inventory_csv():
+    # Streams to a temporary file, so only the finished bytes are held in memory
+    with tempfile.TemporaryFile() as f:
+        text = io.TextIOWrapper(f, encoding='utf-8', newline='')
+        inventory_io.export_items(text)
+        text.flush()
+        f.seek(0)
+        data = f.read()
+        text.detach()
+    return data
+
 def dashboard_view():
     # Reset styles to prevent the login/register page CSS from affecting dashboard buttons
     st.markdown("""
@@ -441,10 +670,18 @@ def dashboard_view():
     st.title("📦 Inventory Dashboard")
 
     # --- Search ---
-    search_query = st.text_input("🔍 Search Inventory", placeholder="Search by name or category...")
+    search_query = st.text_input("🔍 Search Inventory", placeholder="Search by name, category or description...", key="search_query")
+    if search_query:
+        suggestions = [s for s in get_autocomplete_index().suggest(search_query, k=5)
+                       if s.casefold() != search_query.strip().casefold()]
+        if suggestions:
+            st.caption("Suggestions")
+            for col, suggestion in zip(st.columns(len(suggestions)), suggestions):
+                with col:
+                    st.button(suggestion, key=f"suggest_{suggestion}", on_click=use_suggestion, args=(suggestion,))
     
-    # Fetch items early for category dropdowns
-    items = db.get_items()
+    # Categories in use, for the dropdowns (categories table, one index probe each)
+    categories = db.get_categories()
 
     # --- Add Item (ADMIN ONLY) ---
     if role == 'admin':
@@ -453,11 +690,7 @@ def dashboard_view():
                 new_name = st.text_input("Item Name")
                 
                 # Smart Category Selection
-                existing_cats = []
-                if not items.empty and 'category' in items.columns:
-                     existing_cats = items['category'].dropna().unique().tolist()
-                
-                cat_options = ["➕ Create New Category"] + existing_cats
+                cat_options = ["➕ Create New Category"] + categories
                 selected_cat = st.selectbox("Category", cat_options)
                 
                 if selected_cat == "➕ Create New Category":
@@ -497,54 +730,139 @@ def dashboard_view():
                          confirm_create_admin_dialog(new_admin_user, new_admin_pass)
 
 
+    # --- Bulk Import / Export (ADMIN ONLY) ---
+    if role == 'admin':
+        with st.expander("📥 Bulk Import / Export"):
+            st.caption(f"Upload a CSV or Excel file with columns: {', '.join(inventory_io.IMPORT_COLUMNS)}.")
+            upload = st.file_uploader("Supplier catalog", type=['csv', 'xlsx'])
+            if upload is not None and st.button("Import Items"):
+                try:
+                    with st.spinner("Importing..."):
+                        result = inventory_io.import_items(upload, upload.name, st.session_state.username)
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    st.success(f"Imported {result['imported']:,} items.")
+                    if result['rejected']:
+                        st.warning(f"{result['rejected']:,} rows were rejected.")
+                        st.dataframe(pd.DataFrame(result['errors'], columns=['Line', 'Error']), hide_index=True)
+
+            st.divider()
+            # Generated only when clicked; nothing is kept in the session
+            st.download_button("Download inventory.csv", inventory_csv, file_name="inventory.csv", mime="text/csv")
+
     # --- View Items ---
     st.subheader("Current Inventory")
-    # items already fetched at top
 
-    
+    # Search results are ranked by relevance, so sorting only applies to browsing
+    sc1, sc2, sc3 = st.columns([2, 1, 1])
+    with sc1: sort_by = st.selectbox("Sort by", list(db.ITEM_SORT_KEYS), format_func=str.title, disabled=bool(search_query))
+    with sc2: page_size = st.selectbox("Rows per page", [25, 50, 100, 250], index=1)
+    with sc3:
+        st.write("")
+        descending = st.toggle("Descending", disabled=bool(search_query))
+
+    # Pager: one cursor per visited page (a keyset cursor when browsing, an
+    # offset into the ranked results when searching). Changing the filter or
+    # the ordering invalidates the cursors, so start again from page 1.
+    page_key = (search_query, sort_by, descending, page_size)
+    if st.session_state.get('inv_page_key') != page_key:
+        st.session_state.inv_page_key = page_key
+        st.session_state.inv_cursors = [None]
+    cursors = st.session_state.inv_cursors
+
+    if search_query:
+        offset = cursors[-1] or 0
+        items = db.search_items(search_query, page_size + 1, offset)
+        next_cursor = offset + page_size if len(items) > page_size else None
+        items = items.iloc[:page_size]
+    else:
+        items, next_cursor = db.get_items_page(page_size, cursors[-1], sort_by, descending)
+    if items.empty and len(cursors) > 1:
+        # Last rows of this page were deleted; step back
+        cursors.pop()
+        st.rerun()
+
     if not items.empty:
-        if search_query:
-            items = items[
-                items['name'].str.contains(search_query, case=False) | 
-                items['category'].str.contains(search_query, case=False)
-            ]
-
-        display_df = items.copy()
-        display_df.columns = ['ID', 'Name', 'Category', 'Quantity', 'Price (PHP)', 'Description']
-        st.dataframe(display_df, use_container_width=True, hide_index=True)
+        total = db.count_search_results(search_query) if search_query else db.count_items()
+        display_df = items.rename(columns={
+            'id': 'ID', 'name': 'Name', 'category': 'Category',
+            'quantity': 'Quantity', 'price': 'Price (PHP)', 'description': 'Description'
+        })
+        if role == 'admin' and st.toggle("✏️ Edit this page in a grid", key="grid_edit"):
+            batch_edit_grid(items['id'].tolist())
+        else:
+            st.dataframe(display_df, use_container_width=True, hide_index=True)
+
+        total_pages = max(1, -(-total // page_size))
+        pc1, pc2, pc3 = st.columns([1, 2, 1])
+        with pc1:
+            if st.button("◀ Previous", disabled=len(cursors) == 1):
+                cursors.pop()
+                st.rerun()
+        with pc2:
+            st.caption(f"Page {len(cursors)} of {total_pages} · {total:,} items")
+        with pc3:
+            if st.button("Next ▶", disabled=next_cursor is None):
+                cursors.append(next_cursor)
+                st.rerun()
         
         # --- Manage Items (ADMIN ONLY) ---
         if role == 'admin':
              st.divider()
              st.subheader("Manage Items")
              
+             # Page rows indexed by id, so option labels are O(1) lookups
+             item_names = dict(zip(items['id'].tolist(), items['name'].tolist()))
+
+             # Items on other pages can be picked by ID with a single indexed query
+             lookup_id = st.number_input("Find Item by ID", min_value=0, step=1, value=0, help="Leave at 0 to pick from the current page.", key="item_lookup_id")
+             if lookup_id:
+                 found = db.get_item(int(lookup_id))
+                 if found:
+                     item_names = {found['id']: found['name'], **item_names}
+                 else:
+                     st.warning(f"No item with ID {lookup_id}.")
+
              col1, col2 = st.columns(2)
              
              with col1:
                  st.caption("Delete Item")
-                 delete_id = st.selectbox("Select Item to Delete", items['id'].tolist(), format_func=lambda x: f"ID: {x} - {items[items['id']==x]['name'].values[0]}")
+                 delete_id = st.selectbox("Select Item to Delete", list(item_names), format_func=lambda x: f"ID: {x} - {item_names[x]}")
                  
                  if st.button("Delete Selected"):
-                     item_name = items[items['id']==delete_id]['name'].values[0]
-                     confirm_delete_dialog(delete_id, item_name)
+                     to_delete = db.get_item(delete_id)
+                     if to_delete is None:
+                         st.warning(f"Item ID {delete_id} no longer exists.")
+                     else:
+                         confirm_delete_dialog(to_delete)
      
              with col2:
                   st.caption("Edit Item Details")
-                  edit_id = st.selectbox("Select Item to Edit", items['id'].tolist(), key='edit_select', format_func=lambda x: f"ID: {x} - {items[items['id']==x]['name'].values[0]}")
+                  edit_id = st.selectbox("Select Item to Edit", list(item_names), key='edit_select', format_func=lambda x: f"ID: {x} - {item_names[x]}")
                   
-                  # Pre-fill logic
-                  current_item = items[items['id']==edit_id].iloc[0]
+                  # Pre-fill logic. The form keeps the version it was loaded
+                  # from, so a save can detect edits made by others meanwhile.
+                  current_item = db.get_item(edit_id)
+                  base_key = f"edit_base_{edit_id}"
+                  if st.session_state.get(base_key) is None:
+                      st.session_state[base_key] = current_item
+                  if current_item is not None and current_item['row_version'] != st.session_state[base_key]['row_version']:
+                      st.info("Someone else changed this item since you opened it.")
+                      if st.button("Load Latest Version"):
+                          st.session_state[base_key] = current_item
+                          st.rerun()
+                  current_item = st.session_state[base_key]
                   
                   with st.form(key=f"edit_form_{edit_id}"):
                       upd_name = st.text_input("Name", value=current_item['name'])
                       
                       # Category Logic for Edit
-                      existing_cats = items['category'].dropna().unique().tolist()
-                      cat_options = ["➕ Create New Category"] + existing_cats
+                      cat_options = ["➕ Create New Category"] + categories
                       
                       # Handle current category selection
                       current_cat_index = 0
-                      if current_item['category'] in existing_cats:
+                      if current_item['category'] in categories:
                           current_cat_index = cat_options.index(current_item['category'])
                       
                       selected_cat_edit = st.selectbox("Category", cat_options, index=current_cat_index)
@@ -560,20 +878,164 @@ def dashboard_view():
                       upd_desc = st.text_area("Description", value=current_item['description'] if current_item['description'] else "")
                       
                       if st.form_submit_button("Update Item"):
-                           confirm_update_item_dialog(edit_id, upd_name, upd_cat, upd_qty, upd_price, upd_desc)
+                           st.session_state.pop(f"update_conflict_{edit_id}", None)
+                           confirm_update_item_dialog(edit_id, upd_name, upd_cat, upd_qty, upd_price, upd_desc, current_item)
+
+             # --- Stock Movements ---
+             st.caption("Record Stock Movement")
+             with st.form("stock_movement_form"):
+                 mv1, mv2, mv3 = st.columns([2, 1, 1])
+                 with mv1: move_id = st.selectbox("Item", list(item_names), format_func=lambda x: f"ID: {x} - {item_names[x]}")
+                 with mv2: move_reason = st.selectbox("Reason", db.MOVEMENT_REASONS)
+                 with mv3: move_delta = st.number_input("Change (+ in / - out)", step=1, value=0)
+
+                 if st.form_submit_button("Record Movement"):
+                     if move_delta == 0:
+                         st.error("Enter a non-zero change.")
+                     else:
+                         new_qty = db.record_movement(move_id, int(move_delta), move_reason, st.session_state.username)
+                         if new_qty is None:
+                             st.error("Not enough stock for that movement (or the item no longer exists).")
+                         else:
+                             db.add_log(st.session_state.username, "STOCK_MOVEMENT",
+                                        f"{move_reason} {int(move_delta):+d} for {item_names[move_id]} (ID: {move_id}); now {new_qty}")
+                             st.success(f"Recorded. {item_names[move_id]} now has {new_qty} in stock.")
+                             time.sleep(1)
+                             st.rerun()
+
+             st.caption(f"Recent movements for ID {move_id}")
+             st.dataframe(db.get_stock_movements(move_id, 10), use_container_width=True, hide_index=True)
+
+             # --- Reorder Level ---
+             st.caption("Set Reorder Level")
+             with st.form("reorder_level_form"):
+                 rl1, rl2 = st.columns([2, 1])
+                 with rl1: reorder_id = st.selectbox("Item", list(item_names), key="reorder_select", format_func=lambda x: f"ID: {x} - {item_names[x]}")
+                 with rl2: reorder_level = st.number_input("Reorder Level (0 = off)", min_value=0, step=1, value=0)
+
+                 if st.form_submit_button("Save Reorder Level"):
+                     if db.set_reorder_level(reorder_id, int(reorder_level)):
+                         db.add_log(st.session_state.username, "SET_REORDER_LEVEL",
+                                    f"Reorder level for {item_names[reorder_id]} (ID: {reorder_id}) set to {int(reorder_level)}")
+                         st.success(f"Reorder level for {item_names[reorder_id]} set to {int(reorder_level)}.")
+                         time.sleep(1)
+                         st.rerun()
+                     else:
+                         st.error("That item no longer exists.")
         else:
             st.info("🔒 You are in View-Only mode. Contact an Admin to make changes.")
 
+    elif search_query:
+        st.info("No items match your search.")
     else:
         st.info("No items in inventory.")
 
+    # --- Inventory Summary (ADMIN ONLY) ---
+    if role == 'admin':
+        with st.expander("📊 Inventory Summary by Category"):
+            summary = db.get_category_summary()
+            # Low-stock rows come off the partial index, so counting them stays cheap
+            low_stock = db.get_low_stock_items()
+            summary = summary.assign(  # A new frame: the cached one is shared
+                low_stock=summary['category'].map(low_stock['category'].value_counts()).fillna(0).astype(int))
+            sm1, sm2, sm3, sm4 = st.columns(4)
+            sm1.metric("Categories", f"{(summary['category'] != '').sum():,}")
+            sm2.metric("Items", f"{int(summary['item_count'].sum()):,}")
+            sm3.metric("Stock Value", f"PHP {summary['total_value'].sum():,.2f}")
+            sm4.metric("Low Stock", f"{len(low_stock):,}")
+            st.dataframe(
+                summary.replace({'category': {'': '(Uncategorized)'}}).rename(columns={
+                    'category': 'Category', 'item_count': 'Items', 'total_quantity': 'Units',
+                    'total_value': 'Value (PHP)', 'min_price': 'Min Price', 'max_price': 'Max Price',
+                    'low_stock': 'Low Stock'
+                }),
+                use_container_width=True, hide_index=True,
+            )
+
+    # --- Stock at a Point in Time (ADMIN ONLY) ---
+    if role == 'admin':
+        with st.expander("🕒 Stock at a Point in Time"):
+            st.caption("Rebuilt from the stock ledger. Times are UTC.")
+            pt1, pt2 = st.columns(2)
+            with pt1: as_of_date = st.date_input("Date", key="stock_as_of_date")
+            with pt2: as_of_time = st.time_input("Time", value=dt_time(23, 59), key="stock_as_of_time")
+            if st.button("Show Stock Levels"):
+                levels = db.stock_levels_at(datetime.combine(as_of_date, as_of_time))
+                sl1, sl2 = st.columns(2)
+                sl1.metric("Items in stock", f"{len(levels):,}")
+                sl2.metric("Units in stock", f"{int(levels['quantity'].sum()):,}")
+                st.dataframe(levels.head(1000), use_container_width=True, hide_index=True)
+                if len(levels) > 1000:
+                    st.caption(f"Showing the first 1,000 of {len(levels):,} items.")
+
+    # --- Low Stock Alerts (ADMIN ONLY) ---
+    if role == 'admin':
+        with st.expander("🚨 Low Stock Alerts"):
+            st.caption(f"Raised in the background when stock falls to its reorder level; "
+                       f"re-checked at least every {alerts.SWEEP_INTERVAL // 60} minutes. Times are UTC.")
+            show_resolved = st.checkbox("Include resolved alerts", key="alerts_resolved")
+            st.dataframe(db.get_stock_alerts(open_only=not show_resolved), use_container_width=True, hide_index=True)
+            st.caption("Items at or below their reorder level")
+            st.dataframe(db.get_low_stock_items(), use_container_width=True, hide_index=True)
+
     # --- Activity Logs (ADMIN ONLY) ---
     if role == 'admin':
         with st.expander("📜 Activity Logs (Security Audit)"):
-            st.caption("Monitoring user actions for security and accountability.")
-            logs = db.get_logs()
+            st.caption("Monitoring user actions for security and accountability. Times are UTC; new entries appear within a second.")
+
+            lc1, lc2, lc3, lc4 = st.columns(4)
+            with lc1: log_user = st.text_input("Username", key="log_user")
+            with lc2: log_action = st.selectbox("Action", ["All"] + db.get_log_actions(), key="log_action")
+            with lc3: log_from = st.date_input("From", value=None, key="log_from")
+            with lc4: log_to = st.date_input("To", value=None, key="log_to")
+
+            filters = {
+                'username': log_user.strip() or None,
+                'action': None if log_action == "All" else log_action,
+                'since': log_from,
+                'until': log_to + timedelta(days=1) if log_to else None,
+            }
+
+            # Same cursor-stack pager as the inventory table
+            log_key = tuple(filters.values())
+            if st.session_state.get('log_page_key') != log_key:
+                st.session_state.log_page_key = log_key
+                st.session_state.log_cursors = [None]
+            log_cursors = st.session_state.log_cursors
+
+            logs, next_log_cursor = db.get_logs(limit=50, cursor=log_cursors[-1], **filters)
             st.dataframe(logs, use_container_width=True, hide_index=True)
 
+            nc1, nc2, nc3 = st.columns([1, 2, 1])
+            with nc1:
+                if st.button("◀ Newer", disabled=len(log_cursors) == 1):
+                    log_cursors.pop()
+                    st.rerun()
+            with nc2:
+                st.caption(f"Page {len(log_cursors)}")
+            with nc3:
+                if st.button("Older ▶", disabled=next_log_cursor is None):
+                    log_cursors.append(next_log_cursor)
+                    st.rerun()
+
+    # --- Performance Metrics (ADMIN ONLY) ---
+    if role == 'admin':
+        with st.expander("📈 Performance Metrics"):
+            summary, last_rerun, session_totals = metrics.session_report(st.session_state.session_key)
+            if summary is None:
+                st.info("Metrics appear after the next rerun.")
+            else:
+                mc1, mc2, mc3 = st.columns(3)
+                mc1.metric("Calls (last rerun)", summary['calls'])
+                mc2.metric("Duplicate calls", summary['duplicates'])
+                mc3.metric("Instrumented time", f"{summary['instrumented_ms']:.1f} ms")
+                st.caption(f"Last rerun of the {summary['view']} view. Duplicates repeat an earlier call "
+                           f"with the same arguments in that rerun. Latencies: p95 is a histogram bucket bound.")
+                st.dataframe(last_rerun, use_container_width=True, hide_index=True)
+                st.caption(f"This session ({summary['reruns']} reruns)")
+                st.dataframe(session_totals, use_container_width=True, hide_index=True)
+            st.caption(f"Process-wide totals are written to {metrics.METRICS_FILE} in Prometheus text format.")
+
 # --- Router ---
 if not st.session_state.authenticated:
     if st.session_state.auth_step == 'login':
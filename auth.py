@@ -1,16 +1,103 @@
 import pyotp
 import qrcode
+import qrcode.image.svg
 from passlib.context import CryptContext
 import io
+import json
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+# --- Argon2 Parameters ---
+# Written by calibrate_argon2.py; passlib's defaults apply when absent.
+ARGON2_CONFIG = os.environ.get("ARGON2_CONFIG", "argon2_params.json")
 
-def hash_password(password):
+def load_argon2_params(path=ARGON2_CONFIG):
+    try:
+        with open(path) as f:
+            params = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {key: params[key] for key in ('time_cost', 'memory_cost', 'parallelism') if key in params}
+
+pwd_context = CryptContext(
+    schemes=["argon2"], deprecated="auto",
+    **{f"argon2__{key}": value for key, value in load_argon2_params().items()}
+)
+
+# --- Hashing Service ---
+# Argon2 is deliberately CPU- and memory-heavy. Running it in a process pool
+# keeps a burst of logins from stalling every other session's script thread.
+HASH_WORKERS = os.cpu_count() or 1
+HASH_TIMEOUT = 10  # seconds
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn, not fork: forking Streamlit's multi-threaded server is unsafe
+            _executor = ProcessPoolExecutor(
+                max_workers=HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+def _reset_executor(pool):
+    """Drop a broken pool, unless another thread already replaced it."""
+    global _executor
+    with _executor_lock:
+        if _executor is pool:
+            _executor = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _run_hashing(fn, *args):
+    """Run fn in the pool; raises TimeoutError after HASH_TIMEOUT seconds."""
+    pool = _get_executor()
+    try:
+        future = pool.submit(fn, *args)
+        return future.result(timeout=HASH_TIMEOUT)
+    except TimeoutError:
+        # Subclass of OSError since 3.11: must not fall through to the inline path
+        future.cancel()
+        raise
+    except (BrokenProcessPool, OSError):
+        # Pool died or cannot start here: hash inline rather than fail the login
+        _reset_executor(pool)
+        return fn(*args)
+
+# Worker entry points (module level so they pickle)
+def _hash(password):
     return pwd_context.hash(password)
 
-def verify_password(plain_password, hashed_password):
+def _verify(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+def _verify_and_update(plain_password, hashed_password):
+    if not pwd_context.verify(plain_password, hashed_password):
+        return False, None
+    if pwd_context.needs_update(hashed_password):
+        return True, pwd_context.hash(plain_password)
+    return True, None
+
+def hash_password(password):
+    return _run_hashing(_hash, password)
+
+def verify_password(plain_password, hashed_password):
+    return _run_hashing(_verify, plain_password, hashed_password)
+
+def verify_and_update(plain_password, hashed_password):
+    """
+    Returns (valid, new_hash). new_hash is set when the stored hash used
+    older Argon2 parameters and should replace it.
+    """
+    return _run_hashing(_verify_and_update, plain_password, hashed_password)
+
 def generate_totp_secret():
     return pyotp.random_base32()
 
@@ -24,10 +111,24 @@ def verify_totp(secret, code):
     totp = pyotp.TOTP(secret)
     return totp.verify(code)
 
-def generate_qr_code(uri):
+# --- QR Codes ---
+# Memoized per provisioning URI so reruns of the registration page don't
+# rebuild the image. The URI embeds the TOTP secret, so the cache is small and
+# entries are evicted as soon as registration completes.
+QR_CACHE_MAX = 64
+
+_qr_cache = OrderedDict()  # (uri, fmt) -> PNG bytes or SVG text
+_qr_cache_lock = threading.Lock()
+
+def _render_qr_code(uri, fmt):
     qr = qrcode.QRCode(version=1, box_size=10, border=5)
     qr.add_data(uri)
     qr.make(fit=True)
+    if fmt == 'svg':
+        # Vector output: no raster image or PNG encoding involved
+        img = qr.make_image(image_factory=qrcode.image.svg.SvgPathFillImage)
+        return img.to_string(encoding='unicode')
+
     img = qr.make_image(fill_color="black", back_color="white")
     
     # Convert to bytes for Streamlit
@@ -35,6 +136,27 @@ def generate_qr_code(uri):
     img.save(img_byte_arr, format='PNG')
     return img_byte_arr.getvalue()
 
+def generate_qr_code(uri, fmt='png'):
+    """QR code for `uri` as PNG bytes (fmt='png') or an SVG string (fmt='svg')."""
+    if fmt not in ('png', 'svg'):
+        raise ValueError(f"Unsupported QR format: {fmt!r}")
+    key = (uri, fmt)
+    with _qr_cache_lock:
+        if key in _qr_cache:
+            _qr_cache.move_to_end(key)
+            return _qr_cache[key]
+    image = _render_qr_code(uri, fmt)
+    with _qr_cache_lock:
+        _qr_cache[key] = image
+        while len(_qr_cache) > QR_CACHE_MAX:
+            _qr_cache.popitem(last=False)
+    return image
+
+def evict_qr_code(uri):
+    with _qr_cache_lock:
+        for fmt in ('png', 'svg'):
+            _qr_cache.pop((uri, fmt), None)
+
 import re
 
 def validate_password(password):
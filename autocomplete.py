@@ -0,0 +1,255 @@
+import bisect
+import heapq
+import threading
+from collections import Counter
+
+import db
+
+# Postings longer than this are too common to enumerate; they only add to
+# the score of candidates already found through rarer trigrams.
+MAX_POSTING = 2000
+# Fuzzy matching stops seeding new candidates once this many are found, so
+# scoring cost stays flat as the catalogue grows
+MAX_CANDIDATES = 500
+MIN_SIMILARITY = 0.3
+LOAD_BATCH = 1000
+REFRESH_BATCH = 1000
+
+def _normalize(text):
+    return " ".join(str(text).casefold().split())
+
+def _trigrams(text):
+    # Two leading spaces weight the start of the word, where typos are rarer
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class TrigramIndex:
+    """
+    In-memory autocomplete over item names and categories.
+    Exact prefix matches come from a sorted term list; typo-tolerant matches
+    come from trigram postings scored by Jaccard similarity.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = {}        # normalized term -> term id
+        self._terms = {}      # term id -> (normalized, display text, trigram count)
+        self._refs = Counter()  # term id -> number of items using it
+        self._postings = {}   # trigram -> set of term ids
+        self._sorted = []     # sorted (normalized, term id) for prefix lookups
+        self._unsorted = []   # loaded terms not yet merged into _sorted
+        self._items = {}      # item id -> (name, category)
+        self._next_id = 0
+        self._touched = set()  # item ids written while the initial load runs
+        self.ready = threading.Event()
+        # Inventory data version the index reflects; None for an index not
+        # loaded from the database. Writes from other processes raise the
+        # database's version past it, and refresh() catches up.
+        self._version = None
+        self._refresh_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._terms)
+
+    def _add_term(self, text, keep_sorted=True):
+        key = _normalize(text)
+        if not key:
+            return
+        term_id = self._ids.get(key)
+        if term_id is None:
+            term_id = self._next_id
+            self._next_id += 1
+            grams = _trigrams(key)
+            self._ids[key] = term_id
+            self._terms[term_id] = (key, str(text).strip(), len(grams))
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(term_id)
+            if keep_sorted:
+                bisect.insort(self._sorted, (key, term_id))
+            else:
+                self._unsorted.append((key, term_id))
+        self._refs[term_id] += 1
+
+    def _remove_term(self, text):
+        key = _normalize(text)
+        term_id = self._ids.get(key)
+        if term_id is None:
+            return
+        self._refs[term_id] -= 1
+        if self._refs[term_id] > 0:
+            return
+        del self._refs[term_id]
+        del self._ids[key]
+        del self._terms[term_id]
+        for gram in _trigrams(key):
+            posting = self._postings[gram]
+            posting.discard(term_id)
+            if not posting:
+                del self._postings[gram]
+        pos = bisect.bisect_left(self._sorted, (key, term_id))
+        if pos < len(self._sorted) and self._sorted[pos] == (key, term_id):
+            del self._sorted[pos]
+        else:
+            self._unsorted.remove((key, term_id))  # Only while a load is running
+
+    def add_item(self, item_id, name, category):
+        with self._lock:
+            if not self.ready.is_set():
+                self._touched.add(item_id)
+            if item_id in self._items:
+                self._remove_item(item_id)
+            self._items[item_id] = (name, category)
+            self._add_term(name)
+            if category:
+                self._add_term(category)
+
+    def load(self, rows):
+        """
+        Bulk-add (item_id, name, category) rows. Their terms join the prefix
+        list in finish_load(), which sorts once. Items written since the load
+        began are newer than the rows and are skipped.
+        """
+        with self._lock:
+            for item_id, name, category in rows:
+                if item_id in self._touched:
+                    continue
+                if item_id in self._items:
+                    self._remove_item(item_id)
+                self._items[item_id] = (name, category)
+                self._add_term(name, keep_sorted=False)
+                if category:
+                    self._add_term(category, keep_sorted=False)
+
+    def finish_load(self, version=None):
+        with self._lock:
+            self._version = version
+            self._sorted += self._unsorted
+            self._sorted.sort()
+            self._unsorted = []
+            self._touched.clear()
+            self.ready.set()
+
+    def _remove_item(self, item_id):
+        name, category = self._items.pop(item_id)
+        self._remove_term(name)
+        if category:
+            self._remove_term(category)
+
+    def remove_item(self, item_id):
+        with self._lock:
+            if not self.ready.is_set():
+                self._touched.add(item_id)
+            if item_id in self._items:
+                self._remove_item(item_id)
+
+    def on_item_change(self, action, item_id, name, category):
+        """db item listener: keeps the index in step with inventory writes."""
+        if action == 'delete':
+            self.remove_item(item_id)
+        else:
+            self.add_item(item_id, name, category)
+
+    def refresh(self):
+        """
+        Apply inventory changes made since the index's version, including
+        other processes' writes (CLI imports, the API host). Returns False if
+        a refresh is already running.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            version = self._version
+            while True:
+                page = db.changes_since(version, REFRESH_BATCH)
+                for item_id, name, category in page['items'][['id', 'name', 'category']].itertuples(index=False):
+                    self.add_item(int(item_id), name, category)
+                for item_id in page['deleted']:
+                    self.remove_item(item_id)
+                version = page['version']
+                if not page['has_more']:
+                    break
+            self._version = version
+        finally:
+            self._refresh_lock.release()
+        return True
+
+    def _stale(self):
+        return (self._version is not None and not self._refresh_lock.locked()
+                and db.get_data_version('inventory') != self._version)
+
+    def suggest(self, query, k=5):
+        """Top-k suggestions: prefix matches first, then closest fuzzy matches."""
+        key = _normalize(query)
+        if not key:
+            return []
+        if self._stale():
+            # Catch up off the caller's thread; this answer uses the index as is
+            threading.Thread(target=self.refresh, name="autocomplete-refresh", daemon=True).start()
+        with self._lock:
+            results = []
+            pos = bisect.bisect_left(self._sorted, (key,))
+            while pos < len(self._sorted) and len(results) < k:
+                term, term_id = self._sorted[pos]
+                if not term.startswith(key):
+                    break
+                results.append(term_id)
+                pos += 1
+            if len(results) < k:
+                results += self._fuzzy(key, k - len(results), exclude=set(results))
+            return [self._terms[term_id][1] for term_id in results]
+
+    def _fuzzy(self, key, k, exclude):
+        grams = _trigrams(key)
+        scores = Counter()
+        # Rarest trigrams first: they seed the candidates while the set is
+        # small; later (commoner) trigrams only score candidates already found.
+        postings = sorted(filter(None, map(self._postings.get, grams)), key=len)
+        for posting in postings:
+            if len(scores) < MAX_CANDIDATES and len(posting) <= MAX_POSTING:
+                scores.update(posting)
+            elif len(scores) < len(posting):
+                for term_id in scores:
+                    if term_id in posting:
+                        scores[term_id] += 1
+            else:
+                for term_id in posting:
+                    if term_id in scores:
+                        scores[term_id] += 1
+
+        size = len(grams)
+        terms = self._terms
+        ranked = heapq.nlargest(k, (
+            (shared / (size + terms[term_id][2] - shared), term_id)
+            for term_id, shared in scores.items() if term_id not in exclude
+        ))
+        return [term_id for similarity, term_id in ranked if similarity >= MIN_SIMILARITY]
+
+def _load(index):
+    # Read before the rows: writes racing the load are re-applied by refresh()
+    version = db.get_data_version('inventory')
+    with db.get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, name, category FROM inventory")
+        while True:
+            # Small batches: suggest() and listener updates wait for one at most
+            rows = cursor.fetchmany(LOAD_BATCH)
+            if not rows:
+                break
+            index.load(rows)
+    index.finish_load(version)
+
+def build_index(background=False):
+    """
+    Load every item name and category, then follow inventory writes: this
+    process's through the item listener, other processes' via refresh(). With
+    background=True the index is returned at once and fills in on a daemon
+    thread; suggestions cover the items loaded so far until `ready` is set.
+    """
+    index = TrigramIndex()
+    # Register first: writes racing the load are applied, and load skips them
+    db.add_item_listener(index.on_item_change)
+    if background:
+        threading.Thread(target=_load, args=(index,), name="autocomplete-index-load", daemon=True).start()
+    else:
+        _load(index)
+    return index
@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import string
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import pyotp
+
+import auth
+import autocomplete
+import db
+
+# Reproducible benchmarks for the db layer, search and the login path.
+# Seeds a separate database (never the live one unless --db says so), times
+# each operation and writes machine-readable JSON that can be compared
+# against a stored baseline.
+BENCH_DB = "bench_inventory.db"
+CATEGORIES = ["Electronics", "Hardware", "Office", "Cleaning", "Tools", "Safety",
+              "Packaging", "Furniture", "Lighting", "Plumbing", "Electrical", "Paint"]
+ACTIONS = ["LOGIN", "LOGIN_ATTEMPT", "LOGOUT", "ADD_ITEM", "UPDATE_ITEM", "DELETE_ITEM"]
+BENCH_PASSWORD = "Bench123!"
+SEED_BATCH = 10000
+NOISE_FLOOR_MS = 0.05  # Slowdowns smaller than this are timer noise, not regressions
+
+def _word(rng):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+
+def seed(path, items, users, logs, seed_value=42):
+    """Create a fresh database at `path` with the requested row counts."""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    db.DB_NAME = path
+    db.init_db()
+
+    rng = random.Random(seed_value)
+    vocabulary = [_word(rng) for _ in range(5000)]
+    # One real Argon2 hash shared by every synthetic user keeps seeding fast
+    password_hash = auth.hash_password(BENCH_PASSWORD)
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+
+    with db.get_db() as conn:
+        for offset in range(0, items, SEED_BATCH):
+            conn.executemany(
+                "INSERT INTO inventory (name, category, quantity, price, description) VALUES (?, ?, ?, ?, ?)",
+                [(f"{rng.choice(vocabulary).title()} {rng.choice(vocabulary)} {n}",
+                  rng.choice(CATEGORIES), rng.randint(0, 500), round(rng.uniform(1, 5000), 2),
+                  " ".join(rng.choices(vocabulary, k=8)))
+                 for n in range(offset, min(offset + SEED_BATCH, items))]
+            )
+            conn.commit()
+        for offset in range(0, users, SEED_BATCH):
+            conn.executemany(
+                "INSERT INTO users (username, password_hash, totp_secret, role) VALUES (?, ?, ?, ?)",
+                [(f"user{n}", password_hash, pyotp.random_base32(), 'user')
+                 for n in range(offset, min(offset + SEED_BATCH, users))]
+            )
+            conn.commit()
+        for offset in range(0, logs, SEED_BATCH):
+            conn.executemany(
+                "INSERT INTO logs (username, action, details, timestamp) VALUES (?, ?, ?, ?)",
+                [(f"user{rng.randrange(max(users, 1))}", rng.choice(ACTIONS), "bench",
+                  db.sql_timestamp(start + timedelta(seconds=n * 365 * 86400 / max(logs, 1))))
+                 for n in range(offset, min(offset + SEED_BATCH, logs))]
+            )
+            conn.commit()
+        conn.execute("ANALYZE")
+    db.clear_cache()
+    return vocabulary
+
+def timed(fn, repeat, setup=None):
+    """Run fn `repeat` times; returns latency stats in milliseconds."""
+    samples = []
+    for i in range(repeat):
+        args = setup(i) if setup else ()
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'runs': repeat,
+        'mean_ms': round(statistics.fmean(samples), 4),
+        'p50_ms': round(samples[len(samples) // 2], 4),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        'max_ms': round(samples[-1], 4),
+    }
+
+def run_benchmarks(vocabulary, items, repeat, seed_value=42, full_scan=True):
+    rng = random.Random(seed_value + 1)
+    results = {}
+    max_id = items
+
+    if full_scan:
+        results['get_items'] = timed(db.get_items.uncached, max(1, repeat // 10))
+    results['get_items_page'] = timed(
+        lambda: db.get_items_page.uncached(50, (rng.choice(vocabulary), rng.randint(1, max_id)), 'name'), repeat)
+    results['get_items_page_cached'] = timed(lambda: db.get_items_page(50), repeat)
+    results['count_items'] = timed(db.count_items.uncached, repeat)
+    results['search_items'] = timed(
+        lambda: db.search_items.uncached(rng.choice(vocabulary)[:4], 50, 0), repeat)
+    if full_scan:
+        # The pre-FTS dashboard filter, for comparison
+        frame = db.get_items.uncached()
+        results['search_dataframe_scan'] = timed(
+            lambda: frame[frame['name'].str.contains(rng.choice(vocabulary)[:4], case=False)
+                          | frame['category'].str.contains(rng.choice(vocabulary)[:4], case=False)],
+            max(1, repeat // 10))
+
+    start = time.perf_counter()
+    index = autocomplete.build_index()
+    results['autocomplete_build'] = {'runs': 1, 'mean_ms': round((time.perf_counter() - start) * 1000, 4)}
+    results['autocomplete_suggest'] = timed(
+        lambda: index.suggest(rng.choice(vocabulary)[:-1] + "x", 5), repeat)
+
+    results['get_logs_page'] = timed(lambda: db.get_logs(limit=50), repeat)
+    results['get_logs_user_filter'] = timed(
+        lambda: db.get_logs(username=f"user{rng.randrange(100)}", limit=50), repeat)
+
+    new_ids = []
+    results['add_item'] = timed(
+        lambda: new_ids.append(db.add_item("Bench item", "Tools", 1, 9.99, "bench")), repeat)
+    results['update_item'] = timed(
+        lambda item_id: db.update_item(item_id, "Bench item 2", "Tools", 2, 10.5, "bench"),
+        repeat, setup=lambda i: (new_ids[i],))
+    results['delete_item'] = timed(db.delete_item, repeat, setup=lambda i: (new_ids[i],))
+
+    results['add_log_async'] = timed(lambda: db.add_log("bench", "BENCH", "async"), repeat)
+    db.flush_logs()
+    results['add_log_sync'] = timed(lambda: db.add_log("bench", "BENCH", "sync", sync=True), repeat)
+
+    user = db.get_user("user0") or db.get_user("admin")
+    login_repeat = max(1, repeat // 10)
+    if user and user[1] == "user0":
+        results['login_verify_password'] = timed(
+            lambda: auth.verify_password(BENCH_PASSWORD, user[2]), login_repeat)
+        code = pyotp.TOTP(user[3]).now()
+        results['login_verify_totp'] = timed(lambda: auth.verify_totp(user[3], code), repeat)
+    return results
+
+def compare(results, baseline, tolerance):
+    """Return (name, baseline_ms, current_ms) for every p50 that regressed beyond tolerance."""
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        metric = 'p50_ms' if 'p50_ms' in stats and 'p50_ms' in base else 'mean_ms'
+        if stats[metric] > base[metric] * (1 + tolerance) and stats[metric] - base[metric] > NOISE_FLOOR_MS:
+            regressions.append((name, base[metric], stats[metric]))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed synthetic data and benchmark the inventory system")
+    parser.add_argument("--db", default=BENCH_DB, help="Database file to (re)create")
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--logs", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-full-scan", action="store_true", help="Skip whole-table reads (large volumes)")
+    parser.add_argument("--output", help="Write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    seed_start = time.perf_counter()
+    vocabulary = seed(args.db, args.items, args.users, args.logs, args.seed)
+    seed_seconds = time.perf_counter() - seed_start
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'items': args.items, 'users': args.users, 'logs': args.logs,
+            'repeat': args.repeat, 'seed': args.seed,
+            'seed_seconds': round(seed_seconds, 2),
+        },
+        'results': run_benchmarks(vocabulary, args.items, args.repeat, args.seed, not args.skip_full_scan),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report['results'], json.load(f), args.tolerance)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before:.3f} ms -> {after:.3f} ms", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
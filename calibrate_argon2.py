@@ -0,0 +1,59 @@
+import argparse
+import json
+import os
+import statistics
+import time
+
+from passlib.hash import argon2
+
+import auth
+
+# Pick Argon2 costs for this host: the most memory-hard setting whose hash
+# still finishes within the target latency. Memory is preferred over passes,
+# as it is what makes GPU cracking expensive.
+MEMORY_COSTS_KIB = [19456, 32768, 47104, 65536, 131072, 262144]
+MAX_TIME_COST = 10
+SAMPLES = 3
+
+def measure(time_cost, memory_cost, parallelism):
+    hasher = argon2.using(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+    timings = []
+    for _ in range(SAMPLES):
+        start = time.perf_counter()
+        hasher.hash("calibration-password")
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def calibrate(target_ms=250, max_memory_kib=262144, parallelism=1):
+    """Returns the chosen params dict, or None if even the cheapest misses the target."""
+    best = None
+    for memory_cost in [m for m in MEMORY_COSTS_KIB if m <= max_memory_kib]:
+        for time_cost in range(1, MAX_TIME_COST + 1):
+            elapsed = measure(time_cost, memory_cost, parallelism)
+            print(f"memory_cost={memory_cost:>7} KiB  time_cost={time_cost:>2}  {elapsed:7.1f} ms")
+            if elapsed > target_ms:
+                break
+            best = {'time_cost': time_cost, 'memory_cost': memory_cost,
+                    'parallelism': parallelism, 'measured_ms': round(elapsed, 1)}
+        else:
+            continue
+        if time_cost == 1:
+            break  # A single pass already misses the target; more memory won't help
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate Argon2 costs for a target hash latency")
+    parser.add_argument("--target-ms", type=float, default=250)
+    parser.add_argument("--max-memory-kib", type=int, default=262144)
+    parser.add_argument("--parallelism", type=int, default=1)
+    parser.add_argument("--write", action="store_true", help=f"Save to {auth.ARGON2_CONFIG}")
+    args = parser.parse_args()
+
+    params = calibrate(args.target_ms, args.max_memory_kib, args.parallelism)
+    if params is None:
+        raise SystemExit(f"No setting hashes within {args.target_ms} ms on this host.")
+    print(json.dumps(params, indent=2))
+    if args.write:
+        with open(auth.ARGON2_CONFIG, 'w') as f:
+            json.dump(params, f, indent=2)
+        print(f"Saved to {os.path.abspath(auth.ARGON2_CONFIG)}. Existing hashes are upgraded on next login.")
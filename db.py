@@ -1,67 +1,507 @@
+import atexit
+import functools
+import queue
+import re
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
 import pandas as pd
 from contextlib import contextmanager
 
 DB_NAME = "inventory_system.db"
 
+# --- Connection Pool ---
+# Connections are opened once, configured with WAL journaling and tuned
+# pragmas, then handed out again on every get_db() instead of reconnecting.
+POOL_SIZE = 8
+BUSY_TIMEOUT_MS = 5000
+
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+
+def _connect():
+    # check_same_thread=False: a pooled connection may be checked out by a
+    # different Streamlit script thread on the next rerun (never concurrently).
+    conn = sqlite3.connect(DB_NAME, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")  # Readers no longer block on writers
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL, fewer fsyncs
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-16000")  # ~16 MB page cache per connection
+    conn.execute("PRAGMA foreign_keys=ON")  # inventory.category_id -> categories
+    return conn
+
+def _acquire():
+    while True:
+        try:
+            path, conn = _pool.get_nowait()
+        except queue.Empty:
+            return DB_NAME, _connect()
+        if path == DB_NAME:
+            return path, conn
+        conn.close()  # DB_NAME was repointed; drop the stale connection
+
+def _release(path, conn):
+    try:
+        # Match the old close() semantics: uncommitted work is discarded
+        if conn.in_transaction:
+            conn.rollback()
+        _pool.put_nowait((path, conn))
+    except (queue.Full, sqlite3.Error):
+        conn.close()
+
 @contextmanager
 def get_db():
-    conn = sqlite3.connect(DB_NAME)
+    path, conn = _acquire()
     try:
         yield conn
     finally:
+        _release(path, conn)
+
+def close_pool():
+    """Close every idle pooled connection (registered as a shutdown hook)."""
+    while True:
+        try:
+            _, conn = _pool.get_nowait()
+        except queue.Empty:
+            break
         conn.close()
 
+atexit.register(close_pool)
+
+# --- Read Cache ---
+# Process-wide LRU for read functions. Entries are tagged with the version of
+# the table they read; triggers bump a table's row in data_versions on every
+# write, from this process or any other. A dedicated connection polls
+# PRAGMA data_version (which changes only when someone else committed) so the
+# version table is only re-read after an actual write.
+CACHE_MAX_ENTRIES = 256
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_watch_lock = threading.Lock()
+_watch = {'path': None, 'conn': None, 'data_version': None, 'versions': {}}
+
+def get_data_version(table='inventory'):
+    """Monotonic write counter for `table`, shared by every process on the file."""
+    with _watch_lock:
+        if _watch['path'] != DB_NAME:
+            if _watch['conn'] is not None:
+                _watch['conn'].close()
+            _watch.update(path=DB_NAME, conn=_connect(), data_version=None, versions={})
+        conn = _watch['conn']
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != _watch['data_version']:
+            try:
+                rows = conn.execute("SELECT name, version FROM data_versions").fetchall()
+            except sqlite3.OperationalError:
+                rows = []  # Not migrated yet
+            _watch['versions'] = dict(rows)
+            _watch['data_version'] = data_version
+        return _watch['versions'].get(table, 0)
+
+def cached_read(table):
+    """Cache a read function's results until `table` is next written."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (DB_NAME, fn.__name__, args, tuple(sorted(kwargs.items())))
+            # Read the version first: a write racing fn() leaves a stale tag,
+            # which only costs one extra miss.
+            version = get_data_version(table)
+            with _cache_lock:
+                entry = _cache.get(key)
+                if entry is not None and entry[0] == version:
+                    _cache.move_to_end(key)
+                    return entry[1]
+            result = fn(*args, **kwargs)
+            with _cache_lock:
+                _cache[key] = (version, result)
+                _cache.move_to_end(key)
+                while len(_cache) > CACHE_MAX_ENTRIES:
+                    _cache.popitem(last=False)
+            return result
+        wrapper.uncached = fn
+        return wrapper
+    return decorator
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
 import auth # Need to hash password
 
 # ... (imports)
 
-def init_db():
-    """Initialize the database tables."""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        
-        # ... (Create tables logic existing) ...
-        # Users table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                totp_secret TEXT NOT NULL,
-                role TEXT DEFAULT 'user'
-            )
+# --- Schema Migrations ---
+# Each migration is (version, description, fn(cursor)). init_db() applies only
+# the versions newer than the one recorded in schema_version.
+
+def _m001_initial_tables(cursor):
+    # Users table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            totp_secret TEXT NOT NULL,
+            role TEXT DEFAULT 'user'
+        )
+    ''')
+
+    # Inventory table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventory (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            category TEXT,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            price REAL NOT NULL DEFAULT 0.0,
+            description TEXT
+        )
+    ''')
+
+    # Logs table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            action TEXT NOT NULL,
+            details TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def _m002_users_role(cursor):
+    # Databases created before roles existed lack the column
+    cursor.execute("PRAGMA table_info(users)")
+    columns = [info[1] for info in cursor.fetchall()]
+    if 'role' not in columns:
+        cursor.execute("ALTER TABLE users ADD COLUMN role TEXT DEFAULT 'user'")
+
+def _m003_inventory_sort_indexes(cursor):
+    # One index per sortable column so keyset pages are index range scans.
+    # Secondary indexes already carry the rowid (id) as the tie-breaker.
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_name ON inventory(name)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_category ON inventory(COALESCE(category, ''))")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_quantity ON inventory(quantity)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_price ON inventory(price)")
+
+def _m004_inventory_fts(cursor):
+    # External-content FTS5 index over inventory, kept in sync by triggers
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS inventory_fts USING fts5(
+            name, category, description,
+            content='inventory', content_rowid='id', prefix='2 3'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS inventory_fts_ai AFTER INSERT ON inventory BEGIN
+            INSERT INTO inventory_fts (rowid, name, category, description)
+            VALUES (new.id, new.name, new.category, new.description);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS inventory_fts_ad AFTER DELETE ON inventory BEGIN
+            INSERT INTO inventory_fts (inventory_fts, rowid, name, category, description)
+            VALUES ('delete', old.id, old.name, old.category, old.description);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS inventory_fts_au AFTER UPDATE OF name, category, description ON inventory BEGIN
+            INSERT INTO inventory_fts (inventory_fts, rowid, name, category, description)
+            VALUES ('delete', old.id, old.name, old.category, old.description);
+            INSERT INTO inventory_fts (rowid, name, category, description)
+            VALUES (new.id, new.name, new.category, new.description);
+        END
+    ''')
+    # Index rows that existed before the table was created
+    cursor.execute("INSERT INTO inventory_fts (inventory_fts) VALUES ('rebuild')")
+
+def _m005_data_versions(cursor):
+    # Per-table write counters backing the read cache
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES ('inventory', 0)")
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS inventory_version_{event.lower()} AFTER {event} ON inventory BEGIN
+                UPDATE data_versions SET version = version + 1 WHERE name = 'inventory';
+            END
         ''')
-        
-        # Migration: Check if role column exists for existing DBs
-        cursor.execute("PRAGMA table_info(users)")
-        columns = [info[1] for info in cursor.fetchall()]
-        if 'role' not in columns:
-            cursor.execute("ALTER TABLE users ADD COLUMN role TEXT DEFAULT 'user'")
-        
-        # Inventory table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS inventory (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                category TEXT,
-                quantity INTEGER NOT NULL DEFAULT 0,
-                price REAL NOT NULL DEFAULT 0.0,
-                description TEXT
-            )
+
+def _m006_log_indexes(cursor):
+    # Secondary indexes carry the rowid, so each one also orders by id
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs(timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_logs_username_timestamp ON logs(username, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_logs_action_timestamp ON logs(action, timestamp)")
+
+def _m007_login_throttle(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS login_throttle (
+            key TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            failures INTEGER NOT NULL DEFAULT 0,
+            blocked_until REAL NOT NULL DEFAULT 0
+        )
+    ''')
+
+def _m008_logs_data_version(cursor):
+    # Lets the HTTP API validate log ETags without touching the logs table
+    cursor.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES ('logs', 0)")
+    for event in ('INSERT', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS logs_version_{event.lower()} AFTER {event} ON logs BEGIN
+                UPDATE data_versions SET version = version + 1 WHERE name = 'logs';
+            END
         ''')
 
-        # Logs table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT NOT NULL,
-                action TEXT NOT NULL,
-                details TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
+def _m009_inventory_row_versions(cursor):
+    # Per-row change tracking for incremental sync (see changes_since). Rows
+    # take the inventory data version their write produced, so row versions
+    # and tombstone versions share one monotonic sequence.
+    cursor.execute("PRAGMA table_info(inventory)")
+    columns = [info[1] for info in cursor.fetchall()]
+    if 'updated_at' not in columns:
+        cursor.execute("ALTER TABLE inventory ADD COLUMN updated_at TEXT")
+    if 'row_version' not in columns:
+        cursor.execute("ALTER TABLE inventory ADD COLUMN row_version INTEGER NOT NULL DEFAULT 0")
+    # Existing rows get distinct versions in creation order; the counter is
+    # then moved past all of them
+    cursor.execute("UPDATE inventory SET row_version = id WHERE row_version = 0")
+    cursor.execute('''
+        UPDATE data_versions
+        SET version = MAX(version, (SELECT COALESCE(MAX(row_version), 0) FROM inventory))
+        WHERE name = 'inventory'
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_row_version ON inventory(row_version)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_tombstones (
+            id INTEGER PRIMARY KEY,
+            row_version INTEGER NOT NULL,
+            deleted_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_tombstones_row_version ON inventory_tombstones(row_version)")
+
+def _m010_stock_ledger(cursor):
+    # Append-only record of every quantity change. For each item the deltas
+    # sum to its current quantity; snapshots checkpoint those sums so
+    # point-in-time queries only replay the movements after a checkpoint.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_movements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_id INTEGER NOT NULL,
+            delta INTEGER NOT NULL,
+            reason TEXT NOT NULL,
+            username TEXT,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stock_movements_item ON stock_movements(item_id, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stock_movements_created_at ON stock_movements(created_at)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_snapshots (
+            item_id INTEGER NOT NULL,
+            movement_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            PRIMARY KEY (item_id, movement_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stock_snapshots_movement ON stock_snapshots(movement_id)")
+    # Opening balances for existing stock, checkpointed straight away
+    cursor.execute('''
+        INSERT INTO stock_movements (item_id, delta, reason)
+        SELECT id, quantity, 'OPENING' FROM inventory WHERE quantity != 0 ORDER BY id
+    ''')
+    cursor.execute('''
+        INSERT INTO stock_snapshots (item_id, movement_id, quantity)
+        SELECT item_id, MAX(id), SUM(delta) FROM stock_movements GROUP BY item_id
+    ''')
+
+def _m011_category_summary(cursor):
+    # Per-category aggregates kept current by triggers, so the admin summary
+    # reads one row per category instead of scanning inventory. Value is
+    # summed in integer cents so incremental updates never drift; min/max
+    # price are re-read from the (category, price) index when they may change.
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_category_price ON inventory(COALESCE(category, ''), price)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS category_summary (
+            category TEXT PRIMARY KEY,
+            item_count INTEGER NOT NULL,
+            total_quantity INTEGER NOT NULL,
+            total_value_cents INTEGER NOT NULL,
+            min_price REAL,
+            max_price REAL
+        )
+    ''')
+    add_new = '''
+        INSERT INTO category_summary (category, item_count, total_quantity, total_value_cents, min_price, max_price)
+        VALUES (COALESCE(new.category, ''), 1, new.quantity,
+                new.quantity * CAST(ROUND(new.price * 100) AS INTEGER), new.price, new.price)
+        ON CONFLICT(category) DO UPDATE SET
+            item_count = item_count + 1,
+            total_quantity = total_quantity + excluded.total_quantity,
+            total_value_cents = total_value_cents + excluded.total_value_cents,
+            min_price = MIN(min_price, excluded.min_price),
+            max_price = MAX(max_price, excluded.max_price);
+    '''
+    remove_old = '''
+        UPDATE category_summary SET
+            item_count = item_count - 1,
+            total_quantity = total_quantity - old.quantity,
+            total_value_cents = total_value_cents - old.quantity * CAST(ROUND(old.price * 100) AS INTEGER)
+        WHERE category = COALESCE(old.category, '');
+    '''
+    refresh_old_range = '''
+        UPDATE category_summary SET
+            min_price = (SELECT MIN(price) FROM inventory WHERE COALESCE(category, '') = COALESCE(old.category, '')),
+            max_price = (SELECT MAX(price) FROM inventory WHERE COALESCE(category, '') = COALESCE(old.category, ''))
+        WHERE category = COALESCE(old.category, '') {condition};
+        DELETE FROM category_summary WHERE category = COALESCE(old.category, '') AND item_count = 0;
+    '''
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS category_summary_ai AFTER INSERT ON inventory BEGIN {add_new} END")
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS category_summary_ad AFTER DELETE ON inventory BEGIN "
+                   f"{remove_old} {refresh_old_range.format(condition='')} END")
+    # Quantity-only writes (the stock ledger) skip the min/max re-read
+    range_moved = "AND (old.price != new.price OR COALESCE(old.category, '') != COALESCE(new.category, ''))"
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS category_summary_au AFTER UPDATE OF category, quantity, price ON inventory BEGIN "
+                   f"{remove_old} {add_new} {refresh_old_range.format(condition=range_moved)} END")
+    cursor.execute('''
+        INSERT OR REPLACE INTO category_summary
+        SELECT COALESCE(category, ''), COUNT(*), SUM(quantity),
+               SUM(quantity * CAST(ROUND(price * 100) AS INTEGER)), MIN(price), MAX(price)
+        FROM inventory GROUP BY COALESCE(category, '')
+    ''')
+
+def _m012_categories_table(cursor):
+    # Categories become rows of their own; inventory.category_id points at
+    # them. The category name stays on inventory as the denormalised label
+    # that the FTS index, sort index and category_summary are keyed on.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL
+        )
+    ''')
+    cursor.execute("PRAGMA table_info(inventory)")
+    if 'category_id' not in [info[1] for info in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE inventory ADD COLUMN category_id INTEGER REFERENCES categories(id)")
+    cursor.execute('''
+        INSERT OR IGNORE INTO categories (name)
+        SELECT DISTINCT category FROM inventory WHERE category IS NOT NULL AND category != '' ORDER BY category
+    ''')
+    cursor.execute('''
+        UPDATE inventory SET category_id = (SELECT id FROM categories WHERE name = inventory.category)
+        WHERE category IS NOT NULL AND category != ''
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_category_id ON inventory(category_id)")
+    # Own version counter, so get_categories() is cached independently of item writes
+    cursor.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES ('categories', 0)")
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS categories_version_{event.lower()} AFTER {event} ON categories BEGIN
+                UPDATE data_versions SET version = version + 1 WHERE name = 'categories';
+            END
         ''')
-        conn.commit()
+
+def _m013_reorder_alerts(cursor):
+    cursor.execute("PRAGMA table_info(inventory)")
+    if 'reorder_level' not in [info[1] for info in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE inventory ADD COLUMN reorder_level INTEGER NOT NULL DEFAULT 0")
+    # Only items at or below their reorder level are in this index, so the
+    # low-stock list and alert sweeps never scan healthy stock
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_inventory_low_stock ON inventory(id)
+        WHERE reorder_level > 0 AND quantity <= reorder_level
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            reorder_level INTEGER NOT NULL,
+            raised_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            resolved_at TEXT
+        )
+    ''')
+    # At most one open alert per item: raising again is a no-op
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_stock_alerts_open ON stock_alerts(item_id) WHERE resolved_at IS NULL")
+
+def _m014_log_actions(cursor):
+    # Distinct action names for the audit filter, kept current by a trigger so
+    # listing them never scans the logs index. Archived actions stay listed.
+    cursor.execute("CREATE TABLE IF NOT EXISTS log_actions (action TEXT PRIMARY KEY) WITHOUT ROWID")
+    cursor.execute("INSERT OR IGNORE INTO log_actions (action) SELECT DISTINCT action FROM logs")
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS logs_action_insert AFTER INSERT ON logs BEGIN
+            INSERT OR IGNORE INTO log_actions (action) VALUES (NEW.action);
+        END
+    ''')
+
+MIGRATIONS = [
+    (1, "initial tables", _m001_initial_tables),
+    (2, "users.role column", _m002_users_role),
+    (3, "inventory sort indexes", _m003_inventory_sort_indexes),
+    (4, "inventory full-text index", _m004_inventory_fts),
+    (5, "data version counters", _m005_data_versions),
+    (6, "audit log indexes", _m006_log_indexes),
+    (7, "login throttle state", _m007_login_throttle),
+    (8, "logs data version counter", _m008_logs_data_version),
+    (9, "inventory row versions and tombstones", _m009_inventory_row_versions),
+    (10, "stock movement ledger", _m010_stock_ledger),
+    (11, "category summary aggregates", _m011_category_summary),
+    (12, "categories table", _m012_categories_table),
+    (13, "reorder levels and stock alerts", _m013_reorder_alerts),
+    (14, "log action names", _m014_log_actions),
+]
+
+def get_schema_version():
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+        return cursor.fetchone()[0] or 0
+
+def migrate():
+    """Apply pending migrations, each in its own transaction. Returns the new version."""
+    current = get_schema_version()
+    with get_db() as conn:
+        cursor = conn.cursor()
+        for version, description, fn in MIGRATIONS:
+            if version <= current:
+                continue
+            # IMMEDIATE takes the write lock up front so two processes
+            # starting together cannot apply the same migration twice.
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                cursor.execute("SELECT MAX(version) FROM schema_version")
+                if (cursor.fetchone()[0] or 0) >= version:
+                    conn.rollback()
+                    continue
+                fn(cursor)
+                cursor.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+                conn.commit()
+                print(f"Applied migration {version}: {description}")
+            except Exception:
+                conn.rollback()
+                raise
+            current = version
+    return current
+
+_initialized = None  # DB_NAME that init_db() last completed for
+
+def init_db():
+    """Run pending migrations and seed the default admin, once per process."""
+    global _initialized
+    if _initialized == DB_NAME:
+        return
+    migrate()
 
     # --- Default Admin Creation ---
     # Check if admin exists
@@ -79,19 +519,221 @@ def init_db():
         if add_user('admin', hashed, hardcoded_secret, role='admin'):
             add_log('SYSTEM', "INIT_ADMIN", "Created default admin user.")
             print("Default Admin Created: admin / Admin123")
+    _initialized = DB_NAME
+
+# --- Audit Log Writer ---
+# add_log() hands rows to a background thread that group-commits them with
+# executemany, so user actions don't wait on an fsync per log entry.
+LOG_QUEUE_SIZE = 10000
+LOG_BATCH_SIZE = 500
+LOG_FLUSH_INTERVAL = 0.5  # seconds
+LOG_RETRY_DELAY = 0.5     # First wait after a failed write; doubles up to the max
+LOG_RETRY_MAX_DELAY = 10
+
+# Written synchronously: these must be durable before the caller continues
+SECURITY_LOG_ACTIONS = {'INIT_ADMIN', 'USER_REGISTER', 'ADMIN_CREATE_ADMIN'}
 
-def add_log(username, action, details=""):
+_log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+_log_thread = None
+_log_thread_lock = threading.Lock()
+_LOG_STOP = object()
+_log_flush = threading.Event()  # Set by flush_logs(): commit the open batch now
+
+def _write_logs(rows):
     with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO logs (username, action, details) VALUES (?, ?, ?)",
-            (username, action, details)
+        conn.executemany(
+            "INSERT INTO logs (username, action, details, timestamp) VALUES (?, ?, ?, ?)",
+            rows
         )
         conn.commit()
 
-def get_logs():
+def _write_logs_retrying(rows):
+    # OperationalError is transient here (locked or busy, e.g. behind a long
+    # VACUUM), so the batch is retried rather than dropped
+    delay = LOG_RETRY_DELAY
+    while True:
+        try:
+            _write_logs(rows)
+            return
+        except sqlite3.OperationalError as e:
+            print(f"Audit log write failed, retrying {len(rows)} entries in {delay:g}s: {e}")
+            time.sleep(delay)
+            delay = min(delay * 2, LOG_RETRY_MAX_DELAY)
+
+def _log_writer_loop():
+    stopping = False
+    while not stopping:
+        row = _log_queue.get()
+        if row is _LOG_STOP:
+            _log_queue.task_done()
+            break
+        batch = [row]
+        deadline = time.monotonic() + LOG_FLUSH_INTERVAL
+        while len(batch) < LOG_BATCH_SIZE and not _log_flush.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                # Short waits so a flush request is noticed promptly
+                row = _log_queue.get(timeout=min(remaining, 0.05))
+            except queue.Empty:
+                continue
+            if row is _LOG_STOP:
+                _log_queue.task_done()
+                stopping = True
+                break
+            batch.append(row)
+        try:
+            _write_logs_retrying(batch)
+        except Exception as e:
+            print(f"Audit log write failed, {len(batch)} entries lost: {e}")
+        finally:
+            for _ in batch:
+                _log_queue.task_done()
+
+def _ensure_log_writer():
+    global _log_thread
+    with _log_thread_lock:
+        if _log_thread is None or not _log_thread.is_alive():
+            _log_thread = threading.Thread(target=_log_writer_loop, name="audit-log-writer", daemon=True)
+            _log_thread.start()
+
+def add_log(username, action, details="", sync=None):
+    """
+    Record an audit entry. Security-critical actions (or sync=True) are
+    committed before returning; everything else is queued for the writer.
+    """
+    # Stamp now rather than at insert time, which may be a batch later
+    row = (username, action, details, time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime()))
+    if sync is None:
+        sync = action in SECURITY_LOG_ACTIONS
+    if not sync:
+        _ensure_log_writer()
+        try:
+            _log_queue.put_nowait(row)
+            return
+        except queue.Full:
+            pass  # Writer is behind: apply backpressure by writing inline
+    _write_logs([row])
+
+def flush_logs(timeout=5):
+    """Commit everything queued so far, including the writer's open batch."""
+    _log_flush.set()
+    try:
+        rows = []
+        while True:
+            try:
+                rows.append(_log_queue.get_nowait())
+            except queue.Empty:
+                break
+        entries = [row for row in rows if row is not _LOG_STOP]
+        try:
+            if entries:
+                _write_logs(entries)
+        except sqlite3.OperationalError:
+            # Locked or busy: hand everything back to the writer, which retries
+            for row in rows:
+                _log_queue.put(row)
+            raise
+        finally:
+            for _ in rows:
+                _log_queue.task_done()
+        if len(entries) < len(rows):
+            _log_queue.put_nowait(_LOG_STOP)  # Not ours to consume; hand it back
+        # Wait for the batch the writer had already taken off the queue
+        deadline = time.monotonic() + timeout
+        while _log_queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.005)
+    finally:
+        _log_flush.clear()
+
+def stop_log_writer(timeout=5):
+    """Shutdown hook: let the writer finish its batch, then flush the rest."""
+    global _log_thread
+    with _log_thread_lock:
+        thread, _log_thread = _log_thread, None
+    if thread is not None and thread.is_alive():
+        try:
+            _log_queue.put(_LOG_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+    flush_logs()
+
+# Registered after close_pool, so it runs first at exit
+atexit.register(stop_log_writer)
+
+LOG_COLUMNS = ['id', 'username', 'action', 'details', 'timestamp']
+
+def sql_timestamp(value):
+    # logs.timestamp is stored as UTC 'YYYY-MM-DD HH:MM:SS' text
+    if hasattr(value, 'strftime'):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return str(value)
+
+def get_logs(since=None, until=None, username=None, action=None, limit=100, cursor=None):
+    """
+    Newest-first page of audit entries in [since, until), optionally for one
+    username and/or action. `cursor` is the (timestamp, id) of the last row of
+    the previous page. Returns (DataFrame, next_cursor). Entries still queued
+    for the log writer are not included; call flush_logs() first when the
+    caller must see its own writes.
+    """
+    clauses, params = [], []
+    if since is not None:
+        clauses.append("timestamp >= ?")
+        params.append(sql_timestamp(since))
+    if until is not None:
+        clauses.append("timestamp < ?")
+        params.append(sql_timestamp(until))
+    if username:
+        clauses.append("username = ?")
+        params.append(username)
+    if action:
+        clauses.append("action = ?")
+        params.append(action)
+    if cursor is not None:
+        # Leading bound lets SQLite seek the index, as in get_items_page
+        clauses.append("timestamp <= ? AND (timestamp, id) < (?, ?)")
+        params.extend([cursor[0], *cursor])
+
+    sql = f"SELECT {', '.join(LOG_COLUMNS)} FROM logs"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+    params.append(limit + 1)
+
     with get_db() as conn:
-        return pd.read_sql_query("SELECT * FROM logs ORDER BY timestamp DESC", conn)
+        page = pd.read_sql_query(sql, conn, params=params)
+
+    next_cursor = None
+    if len(page) > limit:
+        page = page.iloc[:limit]
+        last = page.iloc[-1]
+        next_cursor = (last['timestamp'], int(last['id']))
+    return page, next_cursor
+
+def get_log_actions():
+    """Distinct action names, from the trigger-maintained log_actions table."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT action FROM log_actions ORDER BY action")
+        return [row[0] for row in cursor.fetchall()]
+
+# --- User Cache ---
+# User rows keyed by username with a TTL. Misses are cached briefly as well,
+# so repeated "is this username taken?" checks stay off the database. Writers
+# in this process invalidate explicitly; the TTL bounds staleness from others.
+USER_CACHE_TTL = 60  # seconds
+USER_NEGATIVE_TTL = 10
+USER_CACHE_MAX = 1024
+
+_user_cache = OrderedDict()  # (DB_NAME, username) -> (expires_at, row or None)
+_user_cache_lock = threading.Lock()
+
+def invalidate_user(username):
+    with _user_cache_lock:
+        _user_cache.pop((DB_NAME, username), None)
 
 # --- User Operations ---
 # Updated to support 'role' (default 'user')
@@ -99,13 +741,6 @@ def add_user(username, password_hash, totp_secret, role='user'):
     try:
         with get_db() as conn:
             cursor = conn.cursor()
-            
-            # Check if role column exists, if not add it (Migration)
-            cursor.execute("PRAGMA table_info(users)")
-            columns = [info[1] for info in cursor.fetchall()]
-            if 'role' not in columns:
-                cursor.execute("ALTER TABLE users ADD COLUMN role TEXT DEFAULT 'user'")
-                
             cursor.execute(
                 "INSERT INTO users (username, password_hash, totp_secret, role) VALUES (?, ?, ?, ?)",
                 (username, password_hash, totp_secret, role)
@@ -114,39 +749,692 @@ def add_user(username, password_hash, totp_secret, role='user'):
             return True
     except sqlite3.IntegrityError:
         return False
+    finally:
+        invalidate_user(username)
+
+def update_password_hash(username, password_hash):
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE users SET password_hash = ? WHERE username = ?", (password_hash, username))
+        conn.commit()
+    invalidate_user(username)
 
 def get_user(username):
+    key = (DB_NAME, username)
+    now = time.monotonic()
+    with _user_cache_lock:
+        entry = _user_cache.get(key)
+        if entry is not None and entry[0] > now:
+            _user_cache.move_to_end(key)
+            return entry[1]
+
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
-        return cursor.fetchone()
+        user = cursor.fetchone()
+
+    with _user_cache_lock:
+        _user_cache[key] = (now + (USER_CACHE_TTL if user else USER_NEGATIVE_TTL), user)
+        _user_cache.move_to_end(key)
+        while len(_user_cache) > USER_CACHE_MAX:
+            _user_cache.popitem(last=False)
+    return user
+
+# --- Login Throttle State ---
+THROTTLE_FIELDS = ['tokens', 'updated_at', 'failures', 'blocked_until']
+
+def load_throttle_state(key):
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {', '.join(THROTTLE_FIELDS)} FROM login_throttle WHERE key = ?", (key,))
+        row = cursor.fetchone()
+    return dict(zip(THROTTLE_FIELDS, row)) if row else None
+
+def save_throttle_state(key, state):
+    with get_db() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO login_throttle (key, tokens, updated_at, failures, blocked_until) VALUES (?, ?, ?, ?, ?)",
+            (key, *(state[field] for field in THROTTLE_FIELDS))
+        )
+        conn.commit()
+
+# --- Inventory Change Listeners ---
+# Called as fn(action, item_id, name, category) after an inventory write
+# commits ('add', 'update' or 'delete'), so in-memory indexes stay in sync
+# without re-reading the table.
+_item_listeners = []
+
+def add_item_listener(fn):
+    _item_listeners.append(fn)
+
+def _notify_item_change(action, item_id, name=None, category=None):
+    for fn in _item_listeners:
+        fn(action, item_id, name, category)
 
 # --- Inventory Operations ---
+# Every inventory write bumps data_versions.inventory by one (migration 5), so
+# "current version + 1" is exactly the version the write itself produces.
+NEXT_ROW_VERSION = "(SELECT version FROM data_versions WHERE name = 'inventory') + 1"
+# Writes store the category's id next to its name; _ensure_categories runs first
+CATEGORY_ID = "(SELECT id FROM categories WHERE name = ?)"
+
+def _ensure_categories(cursor, names):
+    cursor.executemany("INSERT OR IGNORE INTO categories (name) VALUES (?)", [(name,) for name in set(names) if name])
+
 def add_item(name, category, quantity, price, description):
     with get_db() as conn:
         cursor = conn.cursor()
+        _ensure_categories(cursor, [category])
         cursor.execute(
-            "INSERT INTO inventory (name, category, quantity, price, description) VALUES (?, ?, ?, ?, ?)",
-            (name, category, quantity, price, description)
+            f"""INSERT INTO inventory (name, category, quantity, price, description, updated_at, row_version, category_id)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, {NEXT_ROW_VERSION}, {CATEGORY_ID})""",
+            (name, category, quantity, price, description, category)
         )
+        item_id = cursor.lastrowid
+        if quantity:
+            cursor.execute(
+                "INSERT INTO stock_movements (item_id, delta, reason) VALUES (?, ?, 'OPENING')", (item_id, quantity)
+            )
         conn.commit()
+    _notify_item_change('add', item_id, name, category)
+    return item_id
+
+def add_items(rows):
+    """
+    Insert many (name, category, quantity, price, description) rows in one
+    transaction with executemany. Returns the number of rows inserted.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        # Holding the write lock makes the AUTOINCREMENT range ours alone
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM inventory")
+            first_id = cursor.fetchone()[0]
+            rows = list(rows)
+            _ensure_categories(cursor, [row[1] for row in rows])
+            cursor.executemany(
+                f"""INSERT INTO inventory (name, category, quantity, price, description, updated_at, row_version, category_id)
+                    VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, {NEXT_ROW_VERSION}, {CATEGORY_ID})""",
+                [(*row, row[1]) for row in rows]
+            )
+            cursor.execute(
+                "INSERT INTO stock_movements (item_id, delta, reason) "
+                "SELECT id, quantity, 'OPENING' FROM inventory WHERE id > ? AND quantity != 0",
+                (first_id,)
+            )
+            cursor.execute("SELECT id, name, category FROM inventory WHERE id > ?", (first_id,))
+            added = cursor.fetchall()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    for item_id, name, category in added:
+        _notify_item_change('add', item_id, name, category)
+    return len(added)
 
+@cached_read('inventory')
 def get_items():
     with get_db() as conn:
         return pd.read_sql_query("SELECT * FROM inventory", conn)
 
-def update_item(item_id, name, category, quantity, price, description):
+# --- Paged Inventory Reads ---
+ITEM_COLUMNS = ['id', 'name', 'category', 'quantity', 'price', 'description']
+CHANGE_COLUMNS = ITEM_COLUMNS + ['reorder_level', 'updated_at', 'row_version']
+
+@cached_read('inventory')
+def get_item(item_id):
+    """Single item as a dict keyed by CHANGE_COLUMNS (row_version included), or None."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {', '.join(CHANGE_COLUMNS)} FROM inventory WHERE id = ?", (item_id,))
+        row = cursor.fetchone()
+    return dict(zip(CHANGE_COLUMNS, row)) if row else None
+
+def get_items_by_ids(ids):
+    """Rows (CHANGE_COLUMNS) for the given ids, in id order, read in one snapshot."""
+    ids = list(ids)
+    if not ids:
+        return pd.DataFrame(columns=CHANGE_COLUMNS)
+    with get_db() as conn:
+        return pd.read_sql_query(
+            f"SELECT {', '.join(CHANGE_COLUMNS)} FROM inventory WHERE id IN ({', '.join('?' * len(ids))}) ORDER BY id",
+            conn, params=ids
+        )
+
+# Sort keys map to the exact expressions indexed in migration 3
+ITEM_SORT_KEYS = {
+    'id': 'id',
+    'name': 'name',
+    'category': "COALESCE(category, '')",
+    'quantity': 'quantity',
+    'price': 'price',
+}
+
+def _py_value(value):
+    # numpy scalars from a DataFrame row -> plain Python for sqlite3 params
+    return value.item() if hasattr(value, 'item') else value
+
+@cached_read('inventory')
+def get_items_page(limit=50, cursor=None, sort_by='id', descending=False):
+    """
+    Fetch one page of inventory with keyset pagination.
+    `cursor` is the (sort_value, id) of the last row on the previous page, or
+    None for the first page. Returns (DataFrame, next_cursor); next_cursor is
+    None when there are no further rows.
+    """
+    if sort_by not in ITEM_SORT_KEYS:
+        raise ValueError(f"Cannot sort inventory by {sort_by!r}")
+    sort_expr = ITEM_SORT_KEYS[sort_by]
+    op, direction = ('<', 'DESC') if descending else ('>', 'ASC')
+
+    clauses, params = [], []
+    if cursor is not None:
+        if sort_by == 'id':
+            clauses.append(f"id {op} ?")
+            params.append(cursor[1])
+        else:
+            # The redundant leading bound lets SQLite seek the expression
+            # index too; row values alone only seek plain-column indexes.
+            clauses.append(f"{sort_expr} {op}= ? AND ({sort_expr}, id) {op} (?, ?)")
+            params.extend([cursor[0], *cursor])
+
+    sql = f"SELECT {', '.join(ITEM_COLUMNS)}, {sort_expr} AS sort_key FROM inventory"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += f" ORDER BY {sort_expr} {direction}, id {direction} LIMIT ?"
+    params.append(limit + 1)  # One extra row tells us whether a next page exists
+
+    with get_db() as conn:
+        page = pd.read_sql_query(sql, conn, params=params)
+
+    next_cursor = None
+    if len(page) > limit:
+        page = page.iloc[:limit]
+        last = page.iloc[-1]
+        next_cursor = (_py_value(last['sort_key']), int(last['id']))
+    return page.drop(columns='sort_key'), next_cursor
+
+@cached_read('inventory')
+def count_items():
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM inventory")
+        return cursor.fetchone()[0]
+
+# --- Full-Text Search ---
+# bm25 column weights for (name, category, description)
+SEARCH_WEIGHTS = (10.0, 5.0, 1.0)
+
+def _fts_query(text):
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    terms = re.findall(r"\w+", text)
+    return " ".join(f'"{term}"*' for term in terms)
+
+@cached_read('inventory')
+def search_items(query, limit=50, offset=0):
+    """Ranked prefix search over name, category and description."""
+    match = _fts_query(query)
+    if not match:
+        return pd.DataFrame(columns=ITEM_COLUMNS)
+    columns = ", ".join(f"i.{col}" for col in ITEM_COLUMNS)
+    with get_db() as conn:
+        return pd.read_sql_query(f'''
+            SELECT {columns} FROM inventory_fts f
+            JOIN inventory i ON i.id = f.rowid
+            WHERE inventory_fts MATCH ?
+            ORDER BY bm25(inventory_fts, ?, ?, ?)
+            LIMIT ? OFFSET ?
+        ''', conn, params=(match, *SEARCH_WEIGHTS, limit, offset))
+
+@cached_read('inventory')
+def count_search_results(query):
+    match = _fts_query(query)
+    if not match:
+        return 0
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM inventory_fts WHERE inventory_fts MATCH ?", (match,))
+        return cursor.fetchone()[0]
+
+# Keyed on inventory: an item leaving a category changes the list too, and
+# categories are only ever added by inventory writes
+@cached_read('inventory')
+def get_categories():
+    """Names of categories in use by at least one item, for dropdowns."""
     with get_db() as conn:
         cursor = conn.cursor()
+        # One idx_inventory_category_id probe per category; emptied ones drop out
+        cursor.execute(
+            "SELECT name FROM categories "
+            "WHERE EXISTS (SELECT 1 FROM inventory WHERE category_id = categories.id) ORDER BY name"
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+# --- Category Summary ---
+SUMMARY_COLUMNS = ['category', 'item_count', 'total_quantity', 'total_value', 'min_price', 'max_price']
+
+@cached_read('inventory')
+def get_category_summary():
+    """Per-category counts, stock value and price range; O(categories) via the trigger-maintained table."""
+    with get_db() as conn:
+        return pd.read_sql_query('''
+            SELECT category, item_count, total_quantity, total_value_cents / 100.0 AS total_value, min_price, max_price
+            FROM category_summary ORDER BY total_value_cents DESC
+        ''', conn)
+
+def update_item(item_id, name, category, quantity, price, description, expected_version=None):
+    """
+    Overwrite an item. With expected_version (the row_version the caller
+    read), the write only lands if nobody changed the row since. Returns
+    False on such a conflict or if the item no longer exists.
+    """
+    sql = f"""
+        UPDATE inventory 
+        SET name = ?, category = ?, quantity = ?, price = ?, description = ?,
+            updated_at = CURRENT_TIMESTAMP, row_version = {NEXT_ROW_VERSION}, category_id = {CATEGORY_ID}
+        WHERE id = ?
+    """
+    params = [name, category, quantity, price, description, category, item_id]
+    # A changed quantity is booked in the stock ledger as an adjustment
+    movement_sql = (
+        "INSERT INTO stock_movements (item_id, delta, reason) "
+        "SELECT id, ? - quantity, 'ADJUST' FROM inventory WHERE id = ? AND quantity != ?"
+    )
+    movement_params = [quantity, item_id, quantity]
+    if expected_version is not None:
+        sql += " AND row_version = ?"
+        params.append(expected_version)
+        movement_sql += " AND row_version = ?"
+        movement_params.append(expected_version)
+    with get_db() as conn:
+        cursor = conn.cursor()
+        _ensure_categories(cursor, [category])
+        cursor.execute(movement_sql, movement_params)
+        cursor.execute(sql, params)
+        updated = cursor.rowcount > 0
+        if updated:
+            conn.commit()
+        else:
+            conn.rollback()
+    if updated:
+        _notify_item_change('update', item_id, name, category)
+    return updated
+
+def update_items(changes):
+    """
+    Apply many (id, name, category, quantity, price, description,
+    expected_version) edits in one transaction with executemany. All or
+    nothing: if any row changed or vanished since its expected_version, the
+    whole batch is rolled back. Returns the conflicting ids ([] on success).
+    Each id may appear once; ValueError otherwise.
+    """
+    changes = list(changes)
+    if not changes:
+        return []
+    ids = [change[0] for change in changes]
+    if len(set(ids)) != len(ids):
+        raise ValueError("Each item may appear only once in a batch update")
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.executemany(
+                "INSERT INTO stock_movements (item_id, delta, reason) "
+                "SELECT id, ? - quantity, 'ADJUST' FROM inventory WHERE id = ? AND row_version = ? AND quantity != ?",
+                [(change[3], change[0], change[6], change[3]) for change in changes]
+            )
+            _ensure_categories(cursor, [change[2] for change in changes])
+            cursor.executemany(f"""
+                UPDATE inventory
+                SET name = ?, category = ?, quantity = ?, price = ?, description = ?,
+                    updated_at = CURRENT_TIMESTAMP, row_version = {NEXT_ROW_VERSION}, category_id = {CATEGORY_ID}
+                WHERE id = ? AND row_version = ?
+            """, [(*change[1:6], change[2], change[0], change[6]) for change in changes])
+            if cursor.rowcount != len(changes):
+                conn.rollback()
+                cursor.execute(
+                    f"SELECT id, row_version FROM inventory WHERE id IN ({', '.join('?' * len(ids))})", ids
+                )
+                current = dict(cursor.fetchall())
+                # Nothing was written, so never report success
+                return [change[0] for change in changes if current.get(change[0]) != change[6]] or ids
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    for item_id, name, category, *_ in changes:
+        _notify_item_change('update', item_id, name, category)
+    return []
+
+# Fields a user edits; the rest of CHANGE_COLUMNS is bookkeeping
+EDITABLE_FIELDS = ['name', 'category', 'quantity', 'price', 'description']
+
+def merge_item_changes(base, mine, theirs):
+    """
+    Three-way merge of item dicts: `base` is what the editor loaded, `mine`
+    their edits, `theirs` the row as it is now. Returns (merged, conflicts);
+    conflicting fields default to mine in `merged`.
+    """
+    def norm(value):
+        return '' if value is None else value
+
+    merged, conflicts = {}, []
+    for field in EDITABLE_FIELDS:
+        b, m, t = norm(base[field]), norm(mine[field]), norm(theirs[field])
+        if m == t or m == b:
+            merged[field] = theirs[field]
+        elif t == b:
+            merged[field] = mine[field]
+        else:
+            merged[field] = mine[field]
+            conflicts.append(field)
+    return merged, conflicts
+
+def delete_item(item_id, expected_version=None):
+    """
+    Delete an item. With expected_version, the delete only lands if nobody
+    changed the row since it was read. Returns False on such a conflict or
+    if the item no longer exists.
+    """
+    # Book the remaining stock out so the ledger still sums to zero
+    movement_sql = (
+        "INSERT INTO stock_movements (item_id, delta, reason) "
+        "SELECT id, -quantity, 'DELETE' FROM inventory WHERE id = ? AND quantity != 0"
+    )
+    sql = "DELETE FROM inventory WHERE id = ?"
+    params = [item_id]
+    if expected_version is not None:
+        movement_sql += " AND row_version = ?"
+        sql += " AND row_version = ?"
+        params.append(expected_version)
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(movement_sql, params)
+        cursor.execute(sql, params)
+        deleted = cursor.rowcount > 0
+        if deleted:
+            # The delete trigger has already bumped the counter to this write's version
+            cursor.execute(
+                "INSERT OR REPLACE INTO inventory_tombstones (id, row_version) "
+                "SELECT ?, version FROM data_versions WHERE name = 'inventory'",
+                (item_id,)
+            )
+            conn.commit()
+        else:
+            conn.rollback()
+    if deleted:
+        _notify_item_change('delete', item_id)
+    return deleted
+
+# --- Change Feed ---
+@cached_read('inventory')
+def changes_since(version=0, limit=1000):
+    """
+    Inventory changes after `version` (0 for everything), oldest first.
+    Returns {'version', 'items', 'deleted', 'has_more'}: rows to upsert as a
+    DataFrame, ids deleted since, and the version to pass on the next call.
+    """
+    # One row past the limit from each stream tells whether more remain
+    with get_db() as conn:
+        conn.execute("BEGIN")  # One snapshot for the counter and both reads
+        current = conn.execute("SELECT version FROM data_versions WHERE name = 'inventory'").fetchone()[0]
+        items = pd.read_sql_query(
+            f"SELECT {', '.join(CHANGE_COLUMNS)} FROM inventory WHERE row_version > ? ORDER BY row_version LIMIT ?",
+            conn, params=(version, limit + 1)
+        )
+        tombstones = conn.execute(
+            "SELECT id, row_version FROM inventory_tombstones WHERE row_version > ? ORDER BY row_version LIMIT ?",
+            (version, limit + 1)
+        ).fetchall()
+        conn.rollback()
+
+    has_more = len(items) + len(tombstones) > limit
+    if has_more:
+        # Keep the oldest `limit` changes across both streams
+        cutoff = sorted([*items['row_version'].tolist(), *(v for _, v in tombstones)])[limit - 1]
+        items = items[items['row_version'] <= cutoff].reset_index(drop=True)
+        tombstones = [(item_id, v) for item_id, v in tombstones if v <= cutoff]
+        current = cutoff
+    return {'version': current, 'items': items, 'deleted': [item_id for item_id, _ in tombstones], 'has_more': has_more}
+
+# --- Stock Ledger ---
+MOVEMENT_REASONS = ['RECEIPT', 'ISSUE', 'RETURN', 'ADJUST']  # OPENING/DELETE are written by the item functions
+MOVEMENT_COLUMNS = ['id', 'item_id', 'delta', 'reason', 'username', 'created_at']
+SNAPSHOT_INTERVAL = 10000  # Movements between automatic checkpoints
+
+def record_movement(item_id, delta, reason, username=None):
+    """
+    Book `delta` units in or out of an item: the ledger row and the atomic
+    quantity = quantity + delta happen in one transaction. Returns the new
+    quantity, or None if the item is gone or stock would go negative.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute(f"""
+                UPDATE inventory
+                SET quantity = quantity + ?, updated_at = CURRENT_TIMESTAMP, row_version = {NEXT_ROW_VERSION}
+                WHERE id = ? AND quantity + ? >= 0
+                RETURNING name, category, quantity
+            """, (delta, item_id, delta))
+            row = cursor.fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            cursor.execute(
+                "INSERT INTO stock_movements (item_id, delta, reason, username) VALUES (?, ?, ?, ?)",
+                (item_id, delta, reason, username)
+            )
+            movement_id = cursor.lastrowid
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    name, category, quantity = row
+    _notify_item_change('update', item_id, name, category)
+    if movement_id - last_snapshot_movement() >= SNAPSHOT_INTERVAL:
+        take_stock_snapshot()
+    return quantity
+
+def last_snapshot_movement():
+    with get_db() as conn:
+        return conn.execute("SELECT COALESCE(MAX(movement_id), 0) FROM stock_snapshots").fetchone()[0]
+
+def take_stock_snapshot():
+    """
+    Checkpoint every item that moved since the previous snapshot, at the
+    latest movement id. Items that did not move keep their older checkpoint.
+    Returns the number of items checkpointed.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            previous = cursor.execute("SELECT COALESCE(MAX(movement_id), 0) FROM stock_snapshots").fetchone()[0]
+            latest = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM stock_movements").fetchone()[0]
+            if latest == previous:
+                conn.rollback()
+                return 0
+            cursor.execute('''
+                INSERT INTO stock_snapshots (item_id, movement_id, quantity)
+                SELECT m.item_id, ?, m.moved + COALESCE((
+                    SELECT s.quantity FROM stock_snapshots s
+                    WHERE s.item_id = m.item_id ORDER BY s.movement_id DESC LIMIT 1
+                ), 0)
+                FROM (
+                    SELECT item_id, SUM(delta) AS moved FROM stock_movements
+                    WHERE id > ? AND id <= ? GROUP BY item_id
+                ) m
+            ''', (latest, previous, latest))
+            count = cursor.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return count
+
+def _movement_boundary(cursor, at):
+    # Last movement booked at or before `at`; ids follow booking order
+    cursor.execute(
+        "SELECT id FROM stock_movements WHERE created_at <= ? ORDER BY created_at DESC, id DESC LIMIT 1",
+        (sql_timestamp(at),)
+    )
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+def stock_at(item_id, at):
+    """Quantity of one item as of `at` (UTC datetime or 'YYYY-MM-DD HH:MM:SS')."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN")
+        boundary = _movement_boundary(cursor, at)
         cursor.execute('''
-            UPDATE inventory 
-            SET name = ?, category = ?, quantity = ?, price = ?, description = ?
-            WHERE id = ?
-        ''', (name, category, quantity, price, description, item_id))
-        conn.commit()
+            SELECT movement_id, quantity FROM stock_snapshots
+            WHERE item_id = ? AND movement_id <= ? ORDER BY movement_id DESC LIMIT 1
+        ''', (item_id, boundary))
+        checkpoint, quantity = cursor.fetchone() or (0, 0)
+        cursor.execute(
+            "SELECT COALESCE(SUM(delta), 0) FROM stock_movements WHERE item_id = ? AND id > ? AND id <= ?",
+            (item_id, checkpoint, boundary)
+        )
+        quantity += cursor.fetchone()[0]
+        conn.rollback()
+    return quantity
 
-def delete_item(item_id):
+def stock_levels_at(at):
+    """
+    Every item holding stock as of `at`, as a DataFrame (item_id, name,
+    quantity); name is empty for items deleted since. Each item's latest
+    checkpoint is combined with the movements after the last snapshot run.
+    """
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("DELETE FROM inventory WHERE id = ?", (item_id,))
+        cursor.execute("BEGIN")
+        boundary = _movement_boundary(cursor, at)
+        cursor.execute("SELECT COALESCE(MAX(movement_id), 0) FROM stock_snapshots WHERE movement_id <= ?", (boundary,))
+        checkpoint = cursor.fetchone()[0]
+        levels = pd.read_sql_query('''
+            WITH checkpoints AS (
+                SELECT s.item_id, s.quantity FROM stock_snapshots s
+                JOIN (
+                    SELECT item_id, MAX(movement_id) AS movement_id FROM stock_snapshots
+                    WHERE movement_id <= ? GROUP BY item_id
+                ) latest ON latest.item_id = s.item_id AND latest.movement_id = s.movement_id
+            ),
+            recent AS (
+                SELECT item_id, SUM(delta) AS quantity FROM stock_movements
+                WHERE id > ? AND id <= ? GROUP BY item_id
+            ),
+            combined AS (
+                SELECT item_id, SUM(quantity) AS quantity
+                FROM (SELECT * FROM checkpoints UNION ALL SELECT * FROM recent)
+                GROUP BY item_id
+            )
+            SELECT c.item_id, COALESCE(i.name, '') AS name, c.quantity
+            FROM combined c LEFT JOIN inventory i ON i.id = c.item_id
+            WHERE c.quantity != 0
+            ORDER BY c.item_id
+        ''', conn, params=(checkpoint, checkpoint, boundary))
+        conn.rollback()
+    return levels
+
+def get_stock_movements(item_id, limit=50):
+    """Most recent ledger entries for one item, newest first."""
+    with get_db() as conn:
+        return pd.read_sql_query(
+            f"SELECT {', '.join(MOVEMENT_COLUMNS)} FROM stock_movements WHERE item_id = ? ORDER BY id DESC LIMIT ?",
+            conn, params=(item_id, limit)
+        )
+
+# --- Reorder Alerts ---
+LOW_STOCK_COLUMNS = ['id', 'name', 'category', 'quantity', 'reorder_level']
+# Must match the partial index's WHERE clause for SQLite to use it
+LOW_STOCK_CONDITION = "reorder_level > 0 AND quantity <= reorder_level"
+
+def set_reorder_level(item_id, level):
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            UPDATE inventory SET reorder_level = ?, updated_at = CURRENT_TIMESTAMP, row_version = {NEXT_ROW_VERSION}
+            WHERE id = ? RETURNING name, category
+        """, (level, item_id))
+        row = cursor.fetchone()
         conn.commit()
+    if row:
+        _notify_item_change('update', item_id, *row)
+    return row is not None
+
+@cached_read('inventory')
+def get_low_stock_items():
+    """Items at or below their reorder level, read off the partial index."""
+    with get_db() as conn:
+        return pd.read_sql_query(
+            f"SELECT {', '.join(LOW_STOCK_COLUMNS)} FROM inventory WHERE {LOW_STOCK_CONDITION} ORDER BY id",
+            conn
+        )
+
+def evaluate_stock_alerts(item_ids=None):
+    """
+    Open an alert for each item that is at or below its reorder level and has
+    none open; resolve open alerts whose item recovered or was deleted.
+    `item_ids=None` sweeps every low item and open alert. Returns (raised,
+    resolved) as lists of (item_id, name, quantity, reorder_level).
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            if item_ids is None:
+                cursor.execute(f"SELECT id FROM inventory WHERE {LOW_STOCK_CONDITION}")
+                item_ids = {row[0] for row in cursor.fetchall()}
+                cursor.execute("SELECT item_id FROM stock_alerts WHERE resolved_at IS NULL")
+                item_ids.update(row[0] for row in cursor.fetchall())
+            item_ids = list(item_ids)
+            raised, resolved = [], []
+            # Chunked to stay under SQLite's bound-parameter limit
+            for start in range(0, len(item_ids), 500):
+                chunk = item_ids[start:start + 500]
+                marks = ', '.join('?' * len(chunk))
+                cursor.execute(f"SELECT id, name, quantity, reorder_level FROM inventory WHERE id IN ({marks})", chunk)
+                items = {row[0]: row for row in cursor.fetchall()}
+                cursor.execute(f"""
+                    SELECT a.item_id, COALESCE(i.name, ''), COALESCE(i.quantity, 0), a.reorder_level
+                    FROM stock_alerts a LEFT JOIN inventory i ON i.id = a.item_id
+                    WHERE a.resolved_at IS NULL AND a.item_id IN ({marks})
+                """, chunk)
+                open_alerts = {row[0]: row for row in cursor.fetchall()}
+                for item_id in chunk:
+                    item = items.get(item_id)
+                    low = item is not None and item[3] > 0 and item[2] <= item[3]
+                    if low and item_id not in open_alerts:
+                        cursor.execute(
+                            "INSERT OR IGNORE INTO stock_alerts (item_id, quantity, reorder_level) VALUES (?, ?, ?)",
+                            (item_id, item[2], item[3])
+                        )
+                        if cursor.rowcount:
+                            raised.append(item)
+                    elif not low and item_id in open_alerts:
+                        cursor.execute(
+                            "UPDATE stock_alerts SET resolved_at = CURRENT_TIMESTAMP WHERE item_id = ? AND resolved_at IS NULL",
+                            (item_id,)
+                        )
+                        resolved.append(item or open_alerts[item_id])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return raised, resolved
+
+def get_stock_alerts(open_only=True, limit=100):
+    """Newest alerts first, with the item's current name and quantity."""
+    sql = f'''
+        SELECT a.id, a.item_id, COALESCE(i.name, '(deleted)') AS name, a.quantity, a.reorder_level,
+               a.raised_at, a.resolved_at
+        FROM stock_alerts a LEFT JOIN inventory i ON i.id = a.item_id
+        {"WHERE a.resolved_at IS NULL" if open_only else ""}
+        ORDER BY a.id DESC LIMIT ?
+    '''
+    with get_db() as conn:
+        return pd.read_sql_query(sql, conn, params=(limit,))
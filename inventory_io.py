@@ -0,0 +1,140 @@
+import argparse
+import csv
+import io
+import math
+
+import db
+
+# Bulk inventory import/export. Files are read and written a chunk at a time,
+# so a 50k-row supplier catalog never sits in memory as one DataFrame.
+IMPORT_COLUMNS = ['name', 'category', 'quantity', 'price', 'description']
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+def _iter_csv(file):
+    # utf-8-sig drops the BOM Excel adds when saving CSVs
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    try:
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    finally:
+        text.detach()  # Leave the caller's binary file open
+
+def _iter_excel(file):
+    try:
+        import openpyxl
+    except ImportError:
+        raise ValueError("Excel import needs the openpyxl package (pip install openpyxl).")
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else '' for cell in next(rows, ())]
+        for line, values in enumerate(rows, start=2):
+            if all(value is None for value in values):
+                continue
+            yield line, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+def _iter_rows(file, filename):
+    if filename.lower().endswith(('.xlsx', '.xlsm')):
+        return _iter_excel(file)
+    return _iter_csv(file)
+
+def validate_row(row):
+    """Return (values tuple, None) for a valid row or (None, error message)."""
+    row = {str(key).strip().lower(): value for key, value in row.items() if key is not None}
+    missing = [col for col in ('name', 'quantity', 'price') if col not in row]
+    if missing:
+        return None, f"Missing column(s): {', '.join(missing)}"
+
+    name = str(row['name'] or '').strip()
+    if not name:
+        return None, "Name is required"
+    category = str(row.get('category') or '').strip() or None
+    description = str(row.get('description') or '').strip()
+
+    try:
+        quantity = float(row['quantity'])
+        if not quantity.is_integer():
+            raise ValueError
+        quantity = int(quantity)
+    except (TypeError, ValueError):
+        return None, f"Quantity must be a whole number, got {row['quantity']!r}"
+    try:
+        price = float(row['price'])
+        if not math.isfinite(price):
+            raise ValueError
+    except (TypeError, ValueError):
+        return None, f"Price must be a number, got {row['price']!r}"
+    if quantity < 0 or price < 0:
+        return None, "Quantity and price must be non-negative"
+
+    return (name, category, quantity, round(price, 2), description), None
+
+def import_items(file, filename, username, batch_size=BATCH_SIZE):
+    """
+    Validate and insert every row of a binary CSV/Excel file, committing each
+    batch of valid rows in its own transaction. Returns {'imported',
+    'rejected', 'errors'}; errors lists (line, message) for rejected rows.
+    """
+    imported = 0
+    errors = []
+    error_count = 0
+    batch = []
+    for line, row in _iter_rows(file, filename):
+        values, error = validate_row(row)
+        if error:
+            error_count += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append((line, error))
+            continue
+        batch.append(values)
+        if len(batch) >= batch_size:
+            imported += db.add_items(batch)
+            batch = []
+    if batch:
+        imported += db.add_items(batch)
+
+    db.add_log(username, "BULK_IMPORT", f"Imported {imported} items from {filename} ({error_count} rows rejected)")
+    return {'imported': imported, 'rejected': error_count, 'errors': errors}
+
+def export_items(file, chunk_size=5000):
+    """Stream the whole inventory as CSV into a text file object."""
+    writer = csv.writer(file)
+    writer.writerow(db.ITEM_COLUMNS)
+    exported = 0
+    with db.get_db() as conn:
+        cursor = conn.execute(f"SELECT {', '.join(db.ITEM_COLUMNS)} FROM inventory ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            writer.writerows(rows)
+            exported += len(rows)
+    return exported
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk inventory import and export")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_cmd = commands.add_parser("import", help="Import items from a CSV or Excel file")
+    import_cmd.add_argument("path")
+    import_cmd.add_argument("--user", default="SYSTEM", help="Username recorded in the audit log")
+
+    export_cmd = commands.add_parser("export", help="Export the inventory as CSV")
+    export_cmd.add_argument("path")
+
+    args = parser.parse_args()
+    db.init_db()
+    if args.command == "import":
+        with open(args.path, 'rb') as f:
+            result = import_items(f, args.path, args.user)
+        for line, error in result['errors']:
+            print(f"Line {line}: {error}")
+        print(f"Imported {result['imported']} items, rejected {result['rejected']} rows")
+    else:
+        with open(args.path, 'w', newline='', encoding='utf-8') as f:
+            count = export_items(f)
+        print(f"Exported {count} items to {args.path}")
@@ -0,0 +1,152 @@
+import argparse
+import gzip
+import json
+import os
+import re
+from datetime import datetime, timedelta, timezone
+
+import db
+
+# Audit log retention: rows older than the retention window move out of the
+# primary database into per-month gzip NDJSON files (logs-YYYY-MM.ndjson.gz).
+ARCHIVE_DIR = "log_archive"
+RETENTION_DAYS = 90
+CHUNK_SIZE = 5000
+ARCHIVE_NAME = re.compile(r"logs-(\d{4})-(\d{2})\.ndjson\.gz")
+
+def _to_dict(row):
+    return dict(zip(db.LOG_COLUMNS, row))
+
+def _open_ndjson(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+def archive_logs(days=RETENTION_DAYS, archive_dir=ARCHIVE_DIR, chunk_size=CHUNK_SIZE):
+    """
+    Move log rows older than `days` into monthly archives, one chunk at a
+    time: append the chunk to its archive files, then delete it in a single
+    transaction. A crash between the two steps can only duplicate a chunk in
+    the archive, never lose it. Returns the number of rows archived.
+    """
+    db.flush_logs()
+    os.makedirs(archive_dir, exist_ok=True)
+    cutoff = db.sql_timestamp(datetime.now(timezone.utc) - timedelta(days=days))
+    columns = ', '.join(db.LOG_COLUMNS)
+    archived = 0
+    while True:
+        with db.get_db() as conn:
+            rows = conn.execute(
+                f"SELECT {columns} FROM logs WHERE timestamp < ? ORDER BY timestamp, id LIMIT ?",
+                (cutoff, chunk_size)
+            ).fetchall()
+        if not rows:
+            break
+
+        by_month = {}
+        for row in rows:
+            entry = _to_dict(row)
+            by_month.setdefault(str(entry['timestamp'])[:7], []).append(entry)
+        for month, entries in by_month.items():
+            # Appending adds a gzip member; readers see one continuous stream
+            path = os.path.join(archive_dir, f"logs-{month}.ndjson.gz")
+            with _open_ndjson(path, 'a') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry) + "\n")
+
+        with db.get_db() as conn:
+            conn.executemany("DELETE FROM logs WHERE id = ?", [(row[0],) for row in rows])
+            conn.commit()
+        archived += len(rows)
+    return archived
+
+def _archive_months(archive_dir, since, until):
+    """Archive files whose month overlaps [since, until), oldest first."""
+    try:
+        names = sorted(os.listdir(archive_dir))
+    except FileNotFoundError:
+        return []
+    paths = []
+    for name in names:
+        match = ARCHIVE_NAME.fullmatch(name)
+        if not match:
+            continue
+        year, month = int(match[1]), int(match[2])
+        start = f"{year:04d}-{month:02d}-01"
+        end = f"{year + month // 12:04d}-{month % 12 + 1:02d}-01"
+        if (until is None or start < until) and (since is None or end > since):
+            paths.append(os.path.join(archive_dir, name))
+    return paths
+
+def export_logs(path, since=None, until=None, chunk_size=CHUNK_SIZE, archive_dir=ARCHIVE_DIR):
+    """
+    Stream log rows in [since, until) to an NDJSON file (gzipped if *.gz).
+    Archived months are read from their files first, then the live table.
+    """
+    db.flush_logs()
+    since = db.sql_timestamp(since) if since is not None else None
+    until = db.sql_timestamp(until) if until is not None else None
+
+    exported = 0
+    with _open_ndjson(path, 'w') as f:
+        for archive_path in _archive_months(archive_dir, since, until):
+            with _open_ndjson(archive_path, 'r') as archive:
+                for line in archive:
+                    timestamp = json.loads(line)['timestamp']
+                    if (since is None or timestamp >= since) and (until is None or timestamp < until):
+                        f.write(line if line.endswith("\n") else line + "\n")
+                        exported += 1
+
+        clauses, params = [], []
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        sql = f"SELECT {', '.join(db.LOG_COLUMNS)} FROM logs"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY timestamp, id"
+
+        with db.get_db() as conn:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    f.write(json.dumps(_to_dict(row)) + "\n")
+                exported += len(rows)
+    return exported
+
+def vacuum():
+    """Return the space freed by archiving to the filesystem."""
+    with db.get_db() as conn:
+        conn.execute("VACUUM")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Audit log retention and export")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    archive_cmd = commands.add_parser("archive", help="Move old log rows into monthly gzip archives")
+    archive_cmd.add_argument("--days", type=int, default=RETENTION_DAYS)
+    archive_cmd.add_argument("--dir", default=ARCHIVE_DIR)
+    archive_cmd.add_argument("--vacuum", action="store_true", help="Compact the database afterwards")
+
+    export_cmd = commands.add_parser("export", help="Export a time range as NDJSON")
+    export_cmd.add_argument("path", help="Output file; gzip-compressed if it ends in .gz")
+    export_cmd.add_argument("--since", help="UTC start, e.g. 2025-01-01")
+    export_cmd.add_argument("--until", help="UTC end (exclusive)")
+    export_cmd.add_argument("--dir", default=ARCHIVE_DIR, help="Archive directory to include")
+
+    args = parser.parse_args()
+    db.init_db()
+    if args.command == "archive":
+        count = archive_logs(args.days, args.dir)
+        if args.vacuum:
+            vacuum()
+        print(f"Archived {count} log entries to {args.dir}")
+    else:
+        count = export_logs(args.path, args.since, args.until, archive_dir=args.dir)
+        print(f"Exported {count} log entries to {args.path}")
@@ -0,0 +1,268 @@
+import atexit
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+import auth
+import db
+
+# Call instrumentation for the db layer and the auth hashing/TOTP calls.
+# install() wraps those functions in place, so every caller (app.py, throttle,
+# autocomplete, db itself) is measured without changes. Each call is counted
+# three ways: in the current rerun, in the session's running totals and in
+# process-wide totals per view, which are exported in Prometheus text format.
+METRICS_FILE = os.environ.get('INVENTORY_METRICS_FILE', 'metrics.prom')
+WRITE_INTERVAL = 15  # seconds between Prometheus file rewrites
+MAX_SESSIONS = 1000
+# Histogram bucket upper bounds in seconds; the last bucket is +Inf
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+DB_SKIP = {'get_db', 'cached_read', 'sql_timestamp', 'add_item_listener'}
+AUTH_FUNCTIONS = ['hash_password', 'verify_password', 'verify_and_update', 'generate_totp_secret', 'verify_totp']
+BACKGROUND_VIEW = 'background'
+SECRET_FUNCTIONS = {f"auth.{name}" for name in AUTH_FUNCTIONS}
+
+class CallStats:
+    __slots__ = ('calls', 'errors', 'duplicates', 'rows', 'seconds', 'buckets')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.duplicates = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, seconds, rows, error, duplicate):
+        self.calls += 1
+        self.errors += error
+        self.duplicates += duplicate
+        self.rows += rows or 0
+        self.seconds += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile, in seconds."""
+        target = q * self.calls
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+class RerunStats:
+    def __init__(self, view):
+        self.view = view
+        self.started = time.time()
+        self.calls = {}
+        self.seen = set()
+        self.top_level_seconds = 0.0
+
+_lock = threading.Lock()
+_local = threading.local()
+_totals = {}      # (view, function) -> CallStats, process-wide
+_reruns = {}      # view -> number of reruns started
+_sessions = OrderedDict()  # session_key -> {'current', 'last', 'totals', 'reruns'}
+_installed = False
+_last_write = 0.0
+
+def _row_count(result):
+    if isinstance(result, tuple) and result and isinstance(result[0], pd.DataFrame):
+        result = result[0]  # (page, next_cursor) readers
+    if isinstance(result, (pd.DataFrame, list)):
+        return len(result)
+    return None
+
+def _call_key(name, args, kwargs):
+    # Only a hash is kept, never the arguments; auth calls carry passwords and
+    # TOTP secrets, so they are not duplicate-checked at all.
+    if name in SECRET_FUNCTIONS:
+        return None
+    try:
+        return hash((name, args, tuple(sorted(kwargs.items()))))
+    except TypeError:
+        return None
+
+def _record(name, seconds, rows, error, args, kwargs, top_level):
+    rerun = getattr(_local, 'rerun', None)
+    with _lock:
+        if rerun is None:
+            view = BACKGROUND_VIEW
+            duplicate = False
+        else:
+            view = rerun.view
+            key = _call_key(name, args, kwargs)
+            duplicate = key is not None and key in rerun.seen
+            if key is not None:
+                rerun.seen.add(key)
+            rerun.calls.setdefault(name, CallStats()).observe(seconds, rows, error, duplicate)
+            if top_level:
+                rerun.top_level_seconds += seconds
+            session = getattr(_local, 'session', None)
+            if session is not None:
+                session['totals'].setdefault(name, CallStats()).observe(seconds, rows, error, duplicate)
+        _totals.setdefault((view, name), CallStats()).observe(seconds, rows, error, duplicate)
+
+def instrument(fn, name):
+    """Wrap fn so every call is timed and recorded under `name`."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        depth = getattr(_local, 'depth', 0)
+        _local.depth = depth + 1
+        start = time.perf_counter()
+        result, error = None, False
+        try:
+            result = fn(*args, **kwargs)
+            return result
+        except BaseException:
+            error = True
+            raise
+        finally:
+            _local.depth = depth
+            _record(name, time.perf_counter() - start, _row_count(result), error, args, kwargs, depth == 0)
+    wrapper._metrics_name = name
+    return wrapper
+
+def _instrument_module(module, names):
+    for attr in names:
+        fn = getattr(module, attr)
+        if not getattr(fn, '_metrics_name', None):
+            setattr(module, attr, instrument(fn, f"{module.__name__}.{attr}"))
+
+def install():
+    """Instrument every public db function and the auth hashing/TOTP calls. Idempotent."""
+    global _installed
+    with _lock:
+        if _installed:
+            return
+        _installed = True
+    _instrument_module(db, [
+        attr for attr, value in vars(db).items()
+        if callable(value) and not attr.startswith('_') and attr not in DB_SKIP
+        and getattr(value, '__module__', None) == db.__name__ and not isinstance(value, type)
+    ])
+    _instrument_module(auth, AUTH_FUNCTIONS)
+    atexit.register(write_prometheus)
+
+def begin_rerun(session_key, view):
+    """
+    Start attributing calls on this thread to a new rerun of `session_key`.
+    The session's previous rerun becomes its "last rerun"; Streamlit reruns
+    can end in st.rerun()/st.stop(), so closing happens here, not at the end.
+    """
+    global _last_write
+    rerun = RerunStats(view)
+    with _lock:
+        session = _sessions.pop(session_key, None) or {'current': None, 'last': None, 'totals': {}, 'reruns': 0}
+        _sessions[session_key] = session
+        while len(_sessions) > MAX_SESSIONS:
+            _sessions.popitem(last=False)
+        if session['current'] is not None:
+            session['last'] = session['current']
+        session['current'] = rerun
+        session['reruns'] += 1
+        _reruns[view] = _reruns.get(view, 0) + 1
+        now = time.time()
+        due = now - _last_write >= WRITE_INTERVAL
+        if due:
+            _last_write = now
+    _local.rerun = rerun
+    _local.session = session
+    _local.depth = 0
+    if due:
+        write_prometheus()
+
+def _frame(calls):
+    rows = [{
+        'function': name,
+        'calls': stats.calls,
+        'duplicates': stats.duplicates,
+        'rows': stats.rows,
+        'errors': stats.errors,
+        'total_ms': round(stats.seconds * 1000, 2),
+        'mean_ms': round(stats.seconds * 1000 / stats.calls, 3),
+        'p95_ms': stats.quantile(0.95) * 1000,
+    } for name, stats in calls.items()]
+    frame = pd.DataFrame(rows, columns=['function', 'calls', 'duplicates', 'rows', 'errors', 'total_ms', 'mean_ms', 'p95_ms'])
+    return frame.sort_values('total_ms', ascending=False, ignore_index=True)
+
+def session_report(session_key):
+    """
+    Return (last rerun summary, last rerun DataFrame, session DataFrame). The
+    summary is None until the session has completed a rerun.
+    """
+    with _lock:
+        session = _sessions.get(session_key)
+        if session is None:
+            return None, _frame({}), _frame({})
+        last = session['last']
+        summary = None
+        if last is not None:
+            summary = {
+                'view': last.view,
+                'calls': sum(s.calls for s in last.calls.values()),
+                'duplicates': sum(s.duplicates for s in last.calls.values()),
+                'instrumented_ms': round(last.top_level_seconds * 1000, 2),
+                'reruns': session['reruns'] - 1,
+            }
+        return summary, _frame(dict(last.calls) if last else {}), _frame(dict(session['totals']))
+
+def _labels(**labels):
+    return ",".join(f'{key}="{value}"' for key, value in labels.items())
+
+def render_prometheus():
+    """Process-wide totals in the Prometheus text exposition format."""
+    with _lock:
+        return _render_prometheus()
+
+def _render_prometheus():
+    totals = sorted(_totals.items())
+    reruns = sorted(_reruns.items())
+    lines = [
+        "# HELP inventory_reruns_total Streamlit reruns started, by view.",
+        "# TYPE inventory_reruns_total counter",
+    ]
+    lines += [f"inventory_reruns_total{{{_labels(view=view)}}} {count}" for view, count in reruns]
+    for metric, help_text, field in (
+        ('inventory_calls_total', 'Instrumented function calls.', 'calls'),
+        ('inventory_call_errors_total', 'Calls that raised.', 'errors'),
+        ('inventory_duplicate_calls_total', 'Calls repeating an earlier call with the same arguments in the same rerun.', 'duplicates'),
+        ('inventory_rows_returned_total', 'Rows returned by DataFrame/list results.', 'rows'),
+    ):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        lines += [f"{metric}{{{_labels(view=view, function=name)}}} {getattr(stats, field)}"
+                  for (view, name), stats in totals]
+    lines += [
+        "# HELP inventory_call_seconds Latency of instrumented function calls.",
+        "# TYPE inventory_call_seconds histogram",
+    ]
+    for (view, name), stats in totals:
+        labels = _labels(view=view, function=name)
+        cumulative = 0
+        for bound, count in zip(BUCKETS, stats.buckets):
+            cumulative += count
+            lines.append(f'inventory_call_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'inventory_call_seconds_bucket{{{labels},le="+Inf"}} {stats.calls}')
+        lines.append(f"inventory_call_seconds_sum{{{labels}}} {stats.seconds:.6f}")
+        lines.append(f"inventory_call_seconds_count{{{labels}}} {stats.calls}")
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(path=None):
+    """Atomically rewrite the Prometheus text file (textfile-collector friendly)."""
+    path = path or METRICS_FILE
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            f.write(render_prometheus())
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not write metrics to {path}: {e}")
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """Point db at an empty, migrated database file for one test."""
+    monkeypatch.setattr(db, 'DB_NAME', str(tmp_path / "inventory.db"))
+    monkeypatch.setattr(db, '_initialized', None)
+    monkeypatch.setattr(db, '_item_listeners', [])
+    db.clear_cache()
+    db.init_db()
+    yield db
+    db.flush_logs()
+    db.close_pool()
+    db.clear_cache()
@@ -0,0 +1,61 @@
+import base64
+import json
+import threading
+from http.client import HTTPConnection
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import api
+
+def _cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).rstrip(b'=').decode()
+
+@pytest.fixture
+def client(fresh_db):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), api.ApiHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    token = api.issue_token(fresh_db.get_user('admin'))
+
+    def get(path, method='GET', body=None):
+        conn = HTTPConnection(*server.server_address, timeout=5)
+        conn.request(method, path, body=body, headers={'Authorization': f"Bearer {token}"})
+        response = conn.getresponse()
+        body = json.loads(response.read() or b'null')
+        conn.close()
+        return response.status, body
+    yield get
+    server.shutdown()
+    server.server_close()
+
+@pytest.mark.parametrize('value', [[[], []], ["a", "b"], [1, True], [{}, 1], [1], "x"])
+def test_malformed_cursor_is_rejected(client, value):
+    for path in ('/api/items', '/api/logs'):
+        status, body = client(f"{path}?cursor={_cursor(value)}")
+        assert status == 400
+        assert body == {'error': "Invalid cursor"}
+
+def test_cursor_pages_items(client, fresh_db):
+    for n in range(3):
+        fresh_db.add_item(f"Item {n}", "Tools", n, 1.0, "")
+    status, first = client('/api/items?limit=2')
+    assert status == 200 and len(first['items']) == 2
+    status, second = client(f"/api/items?limit=2&cursor={first['next_cursor']}")
+    assert status == 200
+    assert [row['name'] for row in second['items']] == ["Item 2"]
+    assert second['next_cursor'] is None
+
+def test_unexpected_error_answers_500(client, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(api.db, 'get_items_page', broken)
+    status, body = client('/api/items')
+    assert status == 500
+    assert body == {'error': "Internal server error"}
+
+@pytest.mark.parametrize('body', [b'[1, 2]', b'"admin"', b'42', b'null'])
+def test_token_body_must_be_an_object(client, body):
+    status, reply = client('/api/token', method='POST', body=body)
+    assert status == 400
+    assert reply == {'error': "Body must be a JSON object"}
@@ -0,0 +1,16 @@
+import pytest
+
+import auth
+
+def test_hash_timeout_raises_and_keeps_pool(monkeypatch):
+    auth.hash_password("warm-up")  # Start the pool outside the timed call
+    pool = auth._get_executor()
+    monkeypatch.setattr(auth, 'HASH_TIMEOUT', 0.0001)
+    with pytest.raises(TimeoutError):
+        auth.hash_password("S3cret!pass")
+    assert auth._get_executor() is pool
+
+def test_hash_round_trip():
+    hashed = auth.hash_password("S3cret!pass")
+    assert auth.verify_password("S3cret!pass", hashed)
+    assert auth.verify_and_update("wrong", hashed) == (False, None)
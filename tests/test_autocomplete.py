@@ -0,0 +1,67 @@
+import autocomplete
+
+def _loaded(rows):
+    index = autocomplete.TrigramIndex()
+    index.load(rows)
+    index.finish_load()
+    return index
+
+def test_prefix_then_fuzzy_suggestions():
+    index = _loaded([(1, "Stapler", "Office"), (2, "Staple remover", "Office"), (3, "Hammer", "Tools")])
+    assert index.suggest("stap") == ["Staple remover", "Stapler"]
+    assert index.suggest("hamer") == ["Hammer"]
+
+def test_writes_during_load_win_over_loaded_rows():
+    index = autocomplete.TrigramIndex()
+    index.load([(1, "Stapler", "Office"), (2, "Hammer", "Tools")])
+    index.on_item_change('update', 1, "Stapler XL", "Office")  # Loaded, then edited
+    index.on_item_change('delete', 3, None, None)               # Deleted before its row loads
+    index.on_item_change('update', 4, "Drill", "Tools")         # Edited before its row loads
+    index.load([(3, "Wrench", "Tools"), (4, "Old drill", "Tools")])
+    index.finish_load()
+
+    assert index.ready.is_set()
+    assert index.suggest("stapler") == ["Stapler XL"]
+    assert index.suggest("wrench") == []
+    assert index.suggest("old dr") == []
+    assert index.suggest("dri") == ["Drill"]
+
+def test_fuzzy_candidates_are_bounded(monkeypatch):
+    monkeypatch.setattr(autocomplete, 'MAX_CANDIDATES', 10)
+    index = _loaded([(n, f"Widget {n:04d}", "") for n in range(200)])
+    assert index.suggest("wigdet 0150", k=1) == ["Widget 0150"]
+
+def test_refresh_picks_up_writes_from_other_processes(fresh_db):
+    import sqlite3
+    db = fresh_db
+    db.add_item("Stapler", "Office", 1, 1.0, "")
+    gone = db.add_item("Hammer", "Tools", 1, 1.0, "")
+    index = autocomplete.build_index()
+    assert index.suggest("stap") == ["Stapler"]
+
+    # Another process: same file, no listeners in this one
+    other = sqlite3.connect(db.DB_NAME)
+    other.execute("INSERT INTO categories (name) VALUES ('Office') ON CONFLICT DO NOTHING")
+    other.execute("INSERT INTO inventory (name, category, quantity, price, description, row_version) "
+                  "VALUES ('Staple gun', 'Office', 1, 1.0, '', (SELECT version FROM data_versions WHERE name = 'inventory') + 1)")
+    other.commit()
+    other.close()
+    db.delete_item(gone)  # Deleted by this process, seen through the listener
+
+    assert index.refresh()
+    assert index.suggest("stap") == ["Staple gun", "Stapler"]
+    assert index.suggest("hammer") == []
+    assert not index._stale()
+
+def test_suggest_starts_a_refresh_when_the_database_moved_on(fresh_db, monkeypatch):
+    import time
+    db = fresh_db
+    index = autocomplete.build_index()
+    monkeypatch.setattr(db, '_item_listeners', [])  # As if written by another process
+    db.add_item("Wrench", "Tools", 1, 1.0, "")
+    index.suggest("wren")
+    deadline = time.monotonic() + 5
+    while index._stale() or index._refresh_lock.locked():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert index.suggest("wren") == ["Wrench"]
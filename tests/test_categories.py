@@ -0,0 +1,10 @@
+def test_emptied_categories_leave_the_list(fresh_db):
+    db = fresh_db
+    hammer = db.add_item("Hammer", "Tools", 1, 1.0, "")
+    stapler = db.add_item("Stapler", "Office", 1, 1.0, "")
+    assert db.get_categories() == ["Office", "Tools"]
+
+    db.update_item(hammer, "Hammer", "Hardware", 1, 1.0, "")
+    assert db.get_categories() == ["Hardware", "Office"]
+    db.delete_item(stapler)
+    assert db.get_categories() == ["Hardware"]
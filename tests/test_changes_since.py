@@ -0,0 +1,50 @@
+def _drain(db, limit):
+    version, seen, deleted, calls = 0, {}, set(), 0
+    while True:
+        page = db.changes_since(version, limit)
+        calls += 1
+        for row in page['items'].to_dict('records'):
+            seen[row['id']] = row
+        deleted.update(page['deleted'])
+        version = page['version']
+        if not page['has_more']:
+            return version, seen, deleted, calls
+
+def test_pages_through_more_changes_than_limit(fresh_db):
+    db = fresh_db
+    ids = [db.add_item(f"Item {n}", "Tools", n, 1.0, "") for n in range(3)]
+    version, seen, deleted, calls = _drain(db, 2)
+    assert sorted(seen) == ids
+    assert calls == 2
+    assert version == db.get_data_version('inventory')
+
+def test_mixed_updates_and_deletes_are_all_delivered(fresh_db):
+    db = fresh_db
+    ids = [db.add_item(f"Item {n}", "Tools", n, 1.0, "") for n in range(5)]
+    version = db.changes_since(0, 100)['version']
+    db.update_item(ids[0], "Renamed", "Tools", 9, 1.0, "")
+    db.delete_item(ids[1])
+    db.delete_item(ids[2])
+    db.update_item(ids[3], "Renamed too", "Tools", 9, 1.0, "")
+
+    seen, deleted = {}, set()
+    while True:
+        page = db.changes_since(version, 1)
+        assert len(page['items']) + len(page['deleted']) <= 1
+        seen.update((row['id'], row) for row in page['items'].to_dict('records'))
+        deleted.update(page['deleted'])
+        version = page['version']
+        if not page['has_more']:
+            break
+    assert set(seen) == {ids[0], ids[3]}
+    assert seen[ids[0]]['name'] == "Renamed"
+    assert deleted == {ids[1], ids[2]}
+    assert db.changes_since(version, 1)['items'].empty
+
+def test_exact_limit_reports_no_more(fresh_db):
+    db = fresh_db
+    for n in range(2):
+        db.add_item(f"Item {n}", "Tools", n, 1.0, "")
+    page = db.changes_since(0, 2)
+    assert len(page['items']) == 2
+    assert not page['has_more']
@@ -0,0 +1,37 @@
+def test_delete_with_stale_version_is_rejected(fresh_db):
+    db = fresh_db
+    item_id = db.add_item("Widget", "Tools", 5, 1.0, "")
+    shown = db.get_item(item_id)
+    assert db.update_item(item_id, "Widget v2", "Tools", 7, 1.0, "", expected_version=shown['row_version'])
+
+    assert not db.delete_item(item_id, expected_version=shown['row_version'])
+    assert db.get_item(item_id)['name'] == "Widget v2"
+    assert db.get_stock_movements(item_id, 10)['delta'].sum() == 7  # No DELETE booking left behind
+
+    assert db.delete_item(item_id, expected_version=db.get_item(item_id)['row_version'])
+    assert db.get_item(item_id) is None
+    assert db.changes_since(shown['row_version'])['deleted'] == [item_id]
+
+def test_delete_missing_item_returns_false(fresh_db):
+    assert not fresh_db.delete_item(999)
+
+def test_batch_update_rejects_duplicate_ids(fresh_db):
+    import pytest
+    db = fresh_db
+    item_id = db.add_item("Widget", "Tools", 5, 1.0, "")
+    version = db.get_item(item_id)['row_version']
+    with pytest.raises(ValueError):
+        db.update_items([(item_id, "A", "Tools", 1, 1.0, "", version),
+                         (item_id, "B", "Tools", 2, 1.0, "", version)])
+    assert db.get_item(item_id)['name'] == "Widget"
+
+def test_batch_update_is_all_or_nothing(fresh_db):
+    db = fresh_db
+    first = db.add_item("Widget", "Tools", 5, 1.0, "")
+    second = db.add_item("Gadget", "Tools", 5, 1.0, "")
+    stale = db.get_item(second)['row_version']
+    db.update_item(second, "Gadget v2", "Tools", 5, 1.0, "")
+    conflicts = db.update_items([(first, "Widget v2", "Tools", 6, 1.0, "", db.get_item(first)['row_version']),
+                                 (second, "Gadget v3", "Tools", 6, 1.0, "", stale)])
+    assert conflicts == [second]
+    assert db.get_item(first)['name'] == "Widget"
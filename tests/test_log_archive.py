@@ -0,0 +1,39 @@
+import gzip
+import json
+from datetime import datetime, timedelta, timezone
+
+import log_archive
+
+def _insert_logs(db, timestamps):
+    with db.get_db() as conn:
+        conn.executemany(
+            "INSERT INTO logs (username, action, details, timestamp) VALUES ('alice', 'LOGIN', ?, ?)",
+            [(f"entry {n}", db.sql_timestamp(ts)) for n, ts in enumerate(timestamps)]
+        )
+        conn.commit()
+
+def _read(path):
+    with gzip.open(path, 'rt') as f:
+        return [json.loads(line) for line in f]
+
+def test_export_covers_archived_and_live_rows(fresh_db, tmp_path):
+    db = fresh_db
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    old = [now - timedelta(days=d) for d in (400, 300, 200)]
+    recent = [now - timedelta(days=d) for d in (10, 5)]
+    _insert_logs(db, old + recent)
+    archive_dir = str(tmp_path / "archive")
+    assert log_archive.archive_logs(90, archive_dir) == 3
+
+    everything = tmp_path / "all.ndjson.gz"
+    exported = log_archive.export_logs(str(everything), archive_dir=archive_dir)
+    details = [entry['details'] for entry in _read(everything) if entry['action'] == 'LOGIN']
+    assert details == [f"entry {n}" for n in range(5)]
+    assert exported == len(_read(everything))
+
+    # A range entirely inside the archives, cutting one month's file in half
+    window = tmp_path / "window.ndjson.gz"
+    count = log_archive.export_logs(str(window), since=old[1] - timedelta(seconds=1), until=old[2] + timedelta(seconds=1),
+                                    archive_dir=archive_dir)
+    assert count == 2
+    assert [entry['details'] for entry in _read(window)] == ["entry 1", "entry 2"]
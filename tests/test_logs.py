@@ -0,0 +1,34 @@
+def test_log_actions_follow_inserts(fresh_db):
+    db = fresh_db
+    db.add_log("alice", "LOGIN", sync=True)
+    db.add_log("alice", "ADD_ITEM", "Added Widget", sync=True)
+    db.add_log("bob", "LOGIN", sync=True)
+    assert db.get_log_actions() == sorted({"ADD_ITEM", "INIT_ADMIN", "LOGIN"})
+
+def test_get_logs_sees_queued_entries_after_flush(fresh_db):
+    db = fresh_db
+    db.add_log("alice", "LOGOUT", "queued")
+    db.flush_logs()
+    logs, _ = db.get_logs(action="LOGOUT")
+    assert logs['details'].tolist() == ["queued"]
+
+def test_writer_retries_when_database_is_locked(fresh_db, monkeypatch):
+    import sqlite3
+    db = fresh_db
+    monkeypatch.setattr(db, 'LOG_RETRY_DELAY', 0.01)
+    real_write = db._write_logs
+    failures = []
+
+    def flaky_write(rows):
+        if len(failures) < 3:
+            failures.append(len(rows))
+            raise sqlite3.OperationalError("database is locked")
+        real_write(rows)
+    monkeypatch.setattr(db, '_write_logs', flaky_write)
+
+    db.add_log("alice", "DELETE_ITEM", "Deleted Widget (ID: 1)")
+    db._log_queue.join()
+    monkeypatch.setattr(db, '_write_logs', real_write)
+    logs, _ = db.get_logs(action="DELETE_ITEM")
+    assert len(failures) == 3
+    assert logs['details'].tolist() == ["Deleted Widget (ID: 1)"]
@@ -0,0 +1,18 @@
+import auth
+import metrics
+
+def test_rerun_keeps_no_call_arguments():
+    verify_totp = metrics.instrument(auth.verify_totp, 'auth.verify_totp')
+    lookup = metrics.instrument(lambda name: None, 'db.get_user')
+    secret = auth.generate_totp_secret()
+
+    metrics.begin_rerun('test-session', 'dashboard')
+    verify_totp(secret, "123456")
+    lookup("alice")
+    lookup("alice")
+    metrics.begin_rerun('test-session', 'dashboard')
+
+    last = metrics._sessions['test-session']['last']
+    assert all(isinstance(key, int) for key in last.seen)
+    assert len(last.seen) == 1  # Only the db call; auth calls are not keyed
+    assert last.calls['db.get_user'].duplicates == 1
@@ -0,0 +1,30 @@
+import time
+
+import throttle
+
+def test_flood_past_cap_stays_bounded_and_fast(monkeypatch):
+    monkeypatch.setattr(throttle, 'MAX_TRACKED_KEYS', 1000)
+    limiter = throttle.LoginThrottle()
+    victim = throttle.login_keys("admin", "attacker")
+    for _ in range(throttle.BUCKET_CAPACITY):
+        limiter.acquire(victim)
+    assert limiter.acquire(victim) > 0
+
+    start = time.perf_counter()
+    for n in range(20000):
+        limiter.acquire(throttle.login_keys(f"user{n}", f"session{n}"))
+        if n % 100 == 0:
+            limiter.acquire(victim)  # Active keys stay recently used
+    elapsed = time.perf_counter() - start
+
+    assert len(limiter._states) <= 1000
+    assert limiter.acquire(victim) > 0
+    assert elapsed / 20000 < 0.001  # Per attempt; a full scan would be far slower
+
+def test_lockout_after_repeated_failures():
+    limiter = throttle.LoginThrottle()
+    keys = throttle.login_keys("alice", "s1")
+    for _ in range(throttle.FREE_FAILURES + 1):
+        assert limiter.acquire(keys) == 0
+        limiter.record_failure(keys)
+    assert limiter.acquire(keys) > 0
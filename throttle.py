@@ -0,0 +1,96 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import db
+
+# Login throttling: a token bucket per username and per browser session, plus
+# an exponential lockout after repeated failures. Checked before any Argon2
+# work, so a credential-stuffing burst cannot monopolise the CPU.
+BUCKET_CAPACITY = 5
+REFILL_PER_SECOND = BUCKET_CAPACITY / 300  # A full bucket every 5 minutes
+FREE_FAILURES = 3      # Failures allowed before the lockout kicks in
+BACKOFF_BASE = 2       # Seconds; doubles with each further failure
+MAX_BACKOFF = 15 * 60
+MAX_TRACKED_KEYS = 100000
+
+def login_keys(username, session_key):
+    return [f"user:{username.strip().lower()}", f"session:{session_key}"]
+
+class LoginThrottle:
+    """
+    Thread-safe limiter shared by every session in the process. With
+    persist=True, per-username state is written through to SQLite so
+    lockouts survive a restart.
+    """
+
+    def __init__(self, persist=False):
+        self.persist = persist
+        self._lock = threading.Lock()
+        self._states = OrderedDict()  # Least recently used first
+
+    def _persisted(self, key):
+        return self.persist and key.startswith("user:")
+
+    def _state(self, key, now):
+        state = self._states.get(key)
+        if state is None:
+            state = (self._persisted(key) and db.load_throttle_state(key)) or {
+                'tokens': BUCKET_CAPACITY, 'updated_at': now, 'failures': 0, 'blocked_until': 0
+            }
+            self._states[key] = state
+            self._evict()
+        else:
+            self._states.move_to_end(key)
+        state['tokens'] = min(BUCKET_CAPACITY, state['tokens'] + (now - state['updated_at']) * REFILL_PER_SECOND)
+        state['updated_at'] = now
+        return state
+
+    def _save(self, key, state):
+        if self._persisted(key):
+            db.save_throttle_state(key, state)
+
+    def _evict(self):
+        # Drop the least recently used keys: O(1) per attempt however many
+        # keys a flood creates. Username state is reloaded from SQLite when
+        # persisted, so evicting it does not lift a lockout.
+        while len(self._states) > MAX_TRACKED_KEYS:
+            self._states.popitem(last=False)
+
+    def acquire(self, keys):
+        """Take one attempt for every key. Returns 0 if allowed, else seconds to wait."""
+        now = time.time()
+        with self._lock:
+            states = [self._state(key, now) for key in keys]
+            wait = 0
+            for state in states:
+                wait = max(wait, state['blocked_until'] - now)
+                if state['tokens'] < 1:
+                    wait = max(wait, (1 - state['tokens']) / REFILL_PER_SECOND)
+            if wait > 0:
+                return math.ceil(wait)
+            for key, state in zip(keys, states):
+                state['tokens'] -= 1
+                self._save(key, state)
+            return 0
+
+    def record_failure(self, keys):
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                state = self._state(key, now)
+                state['failures'] += 1
+                excess = state['failures'] - FREE_FAILURES
+                if excess > 0:
+                    state['blocked_until'] = now + min(BACKOFF_BASE * 2 ** (excess - 1), MAX_BACKOFF)
+                self._save(key, state)
+
+    def record_success(self, keys):
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                state = self._state(key, now)
+                state['failures'] = 0
+                state['blocked_until'] = 0
+                self._save(key, state)